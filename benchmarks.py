@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import statistics
+from dataclasses import dataclass
+
+import pytest
+from pytest import StashKey
+
+# Number of recorded values per place and metric used as baseline
+HISTORY_LENGTH = 10
+
+# Minimum number of recorded values before a metric is checked against its baseline
+MIN_SAMPLES = 3
+
+# Minimum number of recorded values before a metric without any variance is checked against its baseline.
+# Discrete or saturated metrics (e.g. a throughput capped by the link rate) often repeat the same value, so a few
+# equal values do not mean that the metric can not vary. Without variance only `TOLERANCE_RELATIVE` applies.
+MIN_SAMPLES_CONSTANT = HISTORY_LENGTH
+
+# A value regresses if it is worse than the baseline mean by more than this many standard deviations ...
+TOLERANCE_SIGMAS = 3.0
+
+# ... and by more than this fraction of the baseline mean
+TOLERANCE_RELATIVE = 0.05
+
+_results_key = StashKey[list["Result"]]()
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark-history",
+        help="JSON file to record benchmark results in. "
+        "Results are checked against the results of previous runs on the same place.",
+    )
+    parser.addoption(
+        "--benchmark-image",
+        help="Only use results recorded with this image as baseline, given as version or digest of /etc/os-release. "
+        "Allows to compare the results of the running image with the results of another image.",
+    )
+
+
+class BenchmarkHistory:
+    """
+    Benchmark results of previous test runs, stored as JSON file.
+    For each place and metric the last `HISTORY_LENGTH` results are kept, together with the image they were
+    measured on.
+    """
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self.places: dict[str, dict[str, list[dict]]] = {}
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.places = json.load(f)
+
+    def record(self, place: str, metric: str, value: float, image: dict):
+        entries = self.places.setdefault(place, {}).setdefault(metric, [])
+        entries.append({"value": value, "image": image})
+        del entries[:-HISTORY_LENGTH]
+
+    def baseline(self, place: str, metric: str, image: str | None = None) -> tuple[float, float] | None:
+        """
+        Return mean and standard deviation of `metric` on `place`, or `None` if there are too few results.
+        Results without any variance need `MIN_SAMPLES_CONSTANT` instead of `MIN_SAMPLES` results.
+        If `image` is given, only results recorded with an image with this version or digest are used.
+        """
+        values = [
+            e["value"]
+            for e in self.places.get(place, {}).get(metric, [])
+            if image is None or image in (e["image"].get("version"), e["image"].get("digest"))
+        ]
+        if len(values) < MIN_SAMPLES:
+            return None
+
+        stdev = statistics.stdev(values)
+        if stdev == 0 and len(values) < MIN_SAMPLES_CONSTANT:
+            return None
+        return statistics.mean(values), stdev
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump(self.places, f, indent=2, sort_keys=True)
+
+
+@dataclass
+class Result:
+    nodeid: str
+    metric: str
+    value: float
+    unit: str
+    # `True` if higher values are better, `False` if lower values are better, `None` if the metric is not checked
+    higher_is_better: bool | None
+    baseline: tuple[float, float] | None
+
+    @property
+    def regressed(self) -> bool:
+        if self.higher_is_better is None or self.baseline is None:
+            return False
+
+        mean, stdev = self.baseline
+        tolerance = max(TOLERANCE_SIGMAS * stdev, TOLERANCE_RELATIVE * abs(mean))
+        if self.higher_is_better:
+            return self.value < mean - tolerance
+        return self.value > mean + tolerance
+
+    def __str__(self):
+        baseline = f"{self.baseline[0]:.2f} ± {self.baseline[1]:.2f}" if self.baseline else "no baseline"
+        return f"{self.metric} = {self.value:.2f} {self.unit} ({baseline})"
+
+
+def image_info(strategy) -> dict:
+    """Identify the image running on the DUT by the version and a digest of its `/etc/os-release`."""
+    os_release = strategy.fact("os-release")
+    fields = dict(line.split("=", 1) for line in os_release if "=" in line)
+    return {
+        "version": fields.get("VERSION", "").strip('"'),
+        "digest": hashlib.sha256("\n".join(os_release).encode()).hexdigest()[:16],
+    }
+
+
+class Benchmark:
+    """
+    Records the results of a benchmark test and checks them against the results of previous runs on the
+    same place.
+    """
+
+    def __init__(self, request, strategy, record_property, history: BenchmarkHistory):
+        self._request = request
+        self._strategy = strategy
+        self._record_property = record_property
+        self._history = history
+        self._image = None
+        self.results: list[Result] = []
+
+    @property
+    def place(self) -> str:
+        return self._strategy.target_hostname
+
+    @property
+    def image(self) -> dict:
+        if self._image is None:
+            self._image = image_info(self._strategy)
+        return self._image
+
+    def record(self, metric: str, value: float, unit: str, higher_is_better: bool | None = True):
+        """
+        Record `value` of `metric` as property of the test and in the benchmark history.
+        Pass `higher_is_better=None` for metrics that are only recorded for reference.
+        """
+        result = Result(
+            nodeid=self._request.node.nodeid,
+            metric=metric,
+            value=value,
+            unit=unit,
+            higher_is_better=higher_is_better,
+            baseline=self._history.baseline(
+                self.place,
+                f"{self._request.node.nodeid}::{metric}",
+                self._request.config.getoption("benchmark_image"),
+            ),
+        )
+        self.results.append(result)
+        self._request.config.stash[_results_key].append(result)
+        self._record_property(f"{metric} [{unit}]" if unit else metric, value)
+
+        if self._history.path:
+            self._history.record(self.place, f"{self._request.node.nodeid}::{metric}", value, self.image)
+
+    def check(self):
+        """Fail if any of the recorded results regressed compared to the baseline."""
+        regressions = [str(r) for r in self.results if r.regressed]
+        assert not regressions, "Regressions compared to previous runs: " + ", ".join(regressions)
+
+
+def pytest_configure(config):
+    config.stash[_results_key] = []
+
+
+@pytest.fixture(scope="session")
+def benchmark_history(pytestconfig):
+    history = BenchmarkHistory(pytestconfig.getoption("benchmark_history"))
+    yield history
+    if history.path:
+        history.save()
+
+
+@pytest.fixture
+def benchmark(request, strategy, record_property, benchmark_history):
+    """
+    Record benchmark results and check them against previous runs on the same place:
+    > benchmark.record("throughput", mbps, "Mbit/s")
+    > benchmark.record("cpu", percent, "%", higher_is_better=None)
+    > benchmark.check()
+    """
+    return Benchmark(request, strategy, record_property, benchmark_history)
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    results = config.stash[_results_key]
+    if not results:
+        return
+
+    rows = [
+        (
+            f"{r.nodeid}::{r.metric}",
+            f"{r.value:.2f} {r.unit}",
+            f"{r.baseline[0]:.2f} ± {r.baseline[1]:.2f}" if r.baseline else "-",
+            "REGRESSED" if r.regressed else "",
+        )
+        for r in results
+    ]
+    widths = [max(len(row[i]) for row in rows + [("metric", "value", "baseline", "")]) for i in range(3)]
+
+    terminalreporter.write_sep("-", "benchmarks")
+    terminalreporter.write_line(f"{'metric':<{widths[0]}}  {'value':>{widths[1]}}  {'baseline':>{widths[2]}}")
+    for (metric, value, baseline, status), result in zip(rows, results, strict=True):
+        line = f"{metric:<{widths[0]}}  {value:>{widths[1]}}  {baseline:>{widths[2]}}  {status}"
+        terminalreporter.write_line(line.rstrip(), red=result.regressed)
@@ -1,11 +1,13 @@
 import contextlib
 import json
+import os
+import re
 import traceback
 from time import monotonic
 
 import pytest
 
-pytest_plugins = ["postmortem"]
+pytest_plugins = ["postmortem", "stateorder", "sharding", "benchmarks", "kernellog", "telemetry"]
 
 
 @pytest.fixture(scope="function")
@@ -43,12 +45,11 @@ def default_bootstate(strategy):
 
 
 @pytest.fixture
-def booted_slot(shell):
+def booted_slot(strategy, shell):
     """Returns booted slot."""
 
     def _booted_slot():
-        [stdout] = shell.run_check("rauc status --output-format=json", timeout=60)
-        rauc_status = json.loads(stdout)
+        rauc_status = json.loads("".join(strategy.fact("rauc-status")))
 
         assert "booted" in rauc_status, 'No "booted" key in rauc status json found'
 
@@ -77,13 +78,12 @@ def set_bootstate_in_bootloader(strategy, default_bootstate):
 
 
 @pytest.fixture
-def rauc_bundle(target, strategy, env, shell):
+def rauc_bundle(strategy, env, shell):
     """Makes the RAUC bundle target-accessible at the returned location."""
     bundle = env.config.get_image_path("rauc_bundle")
 
     def _rauc_bundle():
-        target.activate(strategy.httpprovider)
-        return strategy.httpprovider.stage(bundle)
+        return strategy.stage(bundle)
 
     yield _rauc_bundle
 
@@ -115,5 +115,35 @@ def log_duration(record_property):
     return duration_logger
 
 
+@pytest.fixture
+def artifact(request):
+    """
+    Returns a function that returns the path to store an artifact of the current test at.
+    Artifacts are stored in the directory given via `--artifact-dir`:
+    > with open(artifact("timeline.json"), "w") as f:
+    >     json.dump(timeline, f)
+    """
+
+    def _artifact(name: str) -> str:
+        directory = request.config.getoption("artifact_dir")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, re.sub(r"[^\w.-]+", "_", f"{request.node.name}-{name}"))
+
+    return _artifact
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--artifact-dir",
+        default="artifacts",
+        help="Directory to store artifacts (e.g. measurement data) of the tests in.",
+    )
+    parser.addoption(
+        "--rauc-skip-installed",
+        action="store_true",
+        help="Skip the RAUC installation in test_rauc_install, if the target slot already holds the bundle.",
+    )
+
+
 def pytest_configure(config):
     config.addinivalue_line("markers", "slow: These tests run especially slow.")
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Generate HTTP load on the web server of an LXA TAC, like several labgrid clients polling it at the same time.
+
+Each client is a thread with its own keep-alive connection, which sends requests picked from a weighted mix of
+tacd REST API reads and static downloads from `/srv/` as fast as possible.
+Latency percentiles, throughput and errors are reported per request.
+
+With `--profile` the endpoints used in `tests/test_tacd.py` are instead exercised one after another, one request at a
+time, to profile the latency of each endpoint without interference.
+A latency histogram is reported for each endpoint.
+Only GET requests are sent, unless `--writes` is given: Then writable endpoints are additionally toggled via PUT
+requests, which e.g. switches the power of the DUT connected to the TAC on and off.
+
+The results can be stored via `--output` and compared to the results of a previous run (e.g. with another image)
+via `--baseline`.
+
+Example:
+
+    ./httpbench.py --clients 8 --duration 30 --output new.json --baseline old.json lxatac-00034
+    ./httpbench.py --profile --repetitions 100 --baseline profile.json lxatac-00034
+    ./httpbench.py --profile --writes lxatac-00034
+"""
+
+import argparse
+import bisect
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+import requests
+
+
+@dataclass(frozen=True)
+class Request:
+    method: str
+    path: str
+    data: bytes | None = None
+    # Relative frequency of this request in the mix
+    weight: int = 1
+
+    @property
+    def name(self):
+        return f"{self.method} {self.path}"
+
+
+# Requests similar to the ones labgrid clients send while using a TAC.
+# Only reads, so generating load does not switch any outputs of the TAC.
+DEFAULT_MIX = (
+    Request("GET", "v1/tac/temperatures/soc", weight=2),
+    Request("GET", "v1/dut/feedback/current", weight=4),
+    Request("GET", "v1/dut/feedback/voltage", weight=4),
+    Request("GET", "v1/iobus/feedback/voltage", weight=2),
+    Request("GET", "v1/output/out_0/asserted", weight=2),
+)
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    path: str
+    # Values that are written to the endpoint in turn. Empty for read-only endpoints.
+    states: tuple[bytes, ...] = ()
+
+
+# Endpoints used in tests/test_tacd.py
+PROFILE_ENDPOINTS = (
+    Endpoint("v1/tac/temperatures/soc"),
+    Endpoint("v1/dut/feedback/current"),
+    Endpoint("v1/dut/feedback/voltage"),
+    Endpoint("v1/usb/host/total/feedback/current"),
+    Endpoint("v1/usb/host/port1/feedback/current"),
+    Endpoint("v1/usb/host/port2/feedback/current"),
+    Endpoint("v1/usb/host/port3/feedback/current"),
+    Endpoint("v1/output/out_0/feedback/voltage"),
+    Endpoint("v1/output/out_1/feedback/voltage"),
+    Endpoint("v1/iobus/feedback/current"),
+    Endpoint("v1/iobus/feedback/voltage"),
+    Endpoint("v1/iobus/feedback/fault"),
+    Endpoint("v1/dut/powered", (b'"On"', b'"Off"', b'"OffFloating"')),
+    Endpoint("v1/iobus/powered", (b"true", b"false")),
+    Endpoint("v1/uart/rx/enabled", (b"true", b"false")),
+    Endpoint("v1/uart/tx/enabled", (b"true", b"false")),
+    Endpoint("v1/output/out_0/asserted", (b"true", b"false")),
+    Endpoint("v1/output/out_1/asserted", (b"true", b"false")),
+    Endpoint("v1/tac/display/locator", (b"true", b"false")),
+)
+
+# Upper bounds of the latency histogram buckets in seconds. The last bucket holds everything slower.
+HISTOGRAM_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+@dataclass
+class RequestStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    bytes: int = 0
+
+    def percentile(self, p: int) -> float:
+        """Return the `p`th percentile of the latencies in seconds."""
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else float("nan")
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[p - 1]
+
+    def histogram(self) -> list[int]:
+        """Return the number of latencies in each of the `HISTOGRAM_BUCKETS` (plus one for slower ones)."""
+        counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        for latency in self.latencies:
+            counts[bisect.bisect_left(HISTOGRAM_BUCKETS, latency)] += 1
+        return counts
+
+    def summary(self, duration: float) -> dict:
+        return {
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "rps": len(self.latencies) / duration,
+            "MB/s": self.bytes / duration / 1e6,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "histogram": self.histogram(),
+        }
+
+
+@dataclass
+class LoadResult:
+    duration: float
+    stats: dict[str, RequestStats]
+
+    @property
+    def total(self) -> RequestStats:
+        total = RequestStats()
+        for s in self.stats.values():
+            total.latencies += s.latencies
+            total.errors += s.errors
+            total.bytes += s.bytes
+        return total
+
+    def summary(self) -> dict[str, dict]:
+        summary = {name: s.summary(self.duration) for name, s in sorted(self.stats.items())}
+        summary["total"] = self.total.summary(self.duration)
+        return summary
+
+
+def run_load(
+    base_url: str, mix: tuple[Request, ...] = DEFAULT_MIX, clients: int = 4, duration: float = 10.0, seed: int = 0
+) -> LoadResult:
+    """Run `clients` concurrent clients sending requests from `mix` to `base_url` for `duration` seconds."""
+    stats = {request.name: RequestStats() for request in mix}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(seed + index)
+        weights = [r.weight for r in mix]
+        with requests.Session() as session:
+            while time.monotonic() < deadline:
+                [request] = rng.choices(mix, weights)
+                start = time.monotonic()
+                try:
+                    r = session.request(request.method, f"{base_url}/{request.path}", data=request.data, timeout=10)
+                    ok = r.ok
+                    size = len(r.content)
+                except requests.RequestException:
+                    ok = False
+                    size = 0
+                latency = time.monotonic() - start
+
+                with lock:
+                    if ok:
+                        stats[request.name].latencies.append(latency)
+                        stats[request.name].bytes += size
+                    else:
+                        stats[request.name].errors += 1
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return LoadResult(duration=time.monotonic() - start, stats=stats)
+
+
+def profile(
+    base_url: str, endpoints: tuple[Endpoint, ...] = PROFILE_ENDPOINTS, repetitions: int = 50, writes: bool = False
+) -> LoadResult:
+    """
+    Send `repetitions` GET requests to each endpoint, one at a time.
+    With `writes`, writable endpoints additionally get PUT requests that cycle them through their states.
+    They are reset to their original value afterward.
+    """
+    stats = {}
+    start = time.monotonic()
+
+    def timed(session, name, method, url, data=None):
+        entry = stats.setdefault(name, RequestStats())
+        before = time.monotonic()
+        try:
+            r = session.request(method, url, data=data, timeout=10)
+            r.raise_for_status()
+        except requests.RequestException:
+            entry.errors += 1
+            return None
+        entry.latencies.append(time.monotonic() - before)
+        entry.bytes += len(r.content)
+        return r.content
+
+    with requests.Session() as session:
+        for endpoint in endpoints:
+            url = f"{base_url}/{endpoint.path}"
+            original = timed(session, f"GET {endpoint.path}", "GET", url)
+
+            for i in range(repetitions):
+                timed(session, f"GET {endpoint.path}", "GET", url)
+                if writes and endpoint.states:
+                    state = endpoint.states[i % len(endpoint.states)]
+                    timed(session, f"PUT {endpoint.path}", "PUT", url, state)
+
+            if writes and endpoint.states and original is not None:
+                session.put(url, data=original, timeout=10)
+
+    return LoadResult(duration=time.monotonic() - start, stats=stats)
+
+
+def compare(summary: dict[str, dict], baseline: dict[str, dict], tolerance: float = 0.2) -> list[str]:
+    """
+    Compare the latency percentiles of `summary` against `baseline`.
+    Returns a description of each percentile that is more than `tolerance` slower than in `baseline`.
+    """
+    regressions = []
+    for name, entry in summary.items():
+        if name not in baseline:
+            continue
+        for p in ("p50", "p95", "p99"):
+            if entry[p] > baseline[name][p] * (1 + tolerance):
+                regressions.append(
+                    f"{name} {p}: {entry[p] * 1000:.1f} ms (baseline {baseline[name][p] * 1000:.1f} ms)"
+                )
+    return regressions
+
+
+def format_summary(summary: dict[str, dict]) -> str:
+    width = max(len(name) for name in summary)
+    lines = [f"{'request':<{width}}  {'count':>6}  {'errors':>6}  {'rps':>7}  {'p50':>8}  {'p95':>8}  {'p99':>8}"]
+    for name, e in summary.items():
+        lines.append(
+            f"{name:<{width}}  {e['requests']:>6}  {e['errors']:>6}  {e['rps']:>7.1f}  "
+            f"{e['p50'] * 1000:>5.1f} ms  {e['p95'] * 1000:>5.1f} ms  {e['p99'] * 1000:>5.1f} ms"
+        )
+    return "\n".join(lines)
+
+
+def format_histograms(summary: dict[str, dict]) -> str:
+    width = max(len(name) for name in summary)
+    buckets = [f"<{b * 1000:g}ms" for b in HISTOGRAM_BUCKETS] + ["slower"]
+    lines = [f"{'request':<{width}}  " + " ".join(f"{b:>7}" for b in buckets)]
+    for name, e in summary.items():
+        lines.append(f"{name:<{width}}  " + " ".join(f"{c:>7}" for c in e["histogram"]))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("host", help="hostname or address of the TAC")
+    parser.add_argument("--clients", type=int, default=4, help="number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="duration of the load in seconds")
+    parser.add_argument(
+        "--static",
+        action="append",
+        default=[],
+        help="additionally download this path below /srv/ (e.g. 'test_file'). Can be given multiple times.",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="profile the latency of each endpoint instead of generating load"
+    )
+    parser.add_argument("--repetitions", type=int, default=50, help="requests per endpoint in profile mode")
+    parser.add_argument(
+        "--writes",
+        action="store_true",
+        help="also toggle writable endpoints in profile mode (switches e.g. the DUT power and outputs of the TAC)",
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results to the results of a previous run in this JSON file")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="relative latency increase compared to the baseline to report"
+    )
+    args = parser.parse_args()
+
+    if args.profile:
+        result = profile(f"http://{args.host}", repetitions=args.repetitions, writes=args.writes)
+    else:
+        mix = DEFAULT_MIX + tuple(Request("GET", f"srv/{path}") for path in args.static)
+        result = run_load(f"http://{args.host}", mix, clients=args.clients, duration=args.duration)
+
+    summary = result.summary()
+    print(format_summary(summary))
+    if args.profile:
+        print()
+        print(format_histograms(summary))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import json
+import logging
+
+import pytest
+from pytest import StashKey
+
+from lxatacstrategy import Status
+
+_watermark_key = StashKey[tuple[int, str, str]]()
+_kl_logger = logging.getLogger("kernel-log")
+
+# Kernel messages with this priority or a more severe one are attributed to the tests (4 is warning)
+MAX_PRIORITY = 4
+
+# Returns all kernel messages since the cursor, if the cursor belongs to the running boot.
+# Otherwise, only the last kernel message is returned as new watermark.
+# journald is synced first, so it has processed all messages the kernel logged so far.
+_FETCH = (
+    "journalctl --sync; "
+    "if [ \"$(tr -d - < /proc/sys/kernel/random/boot_id)\" = '{boot_id}' ]; then "
+    "journalctl -k -b -o json --output-fields=MESSAGE,PRIORITY --after-cursor='{cursor}'; else "
+    "journalctl -k -b -n 1 -o json --output-fields=MESSAGE,PRIORITY; fi"
+)
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--no-kernel-log",
+        action="store_true",
+        help="Do not attribute new kernel warnings to the test that produced them.",
+    )
+
+
+def _fetch(strategy, watermark: tuple[str, str]) -> tuple[list[str], tuple[str, str]]:
+    """
+    Fetch the kernel warnings since `watermark` (a boot id and journal cursor) with a single command.
+    Returns the warnings and the new watermark.
+
+    All messages since the watermark are fetched and filtered here, so the last one of them is the new watermark
+    and no message can be logged between the query and the new watermark.
+    """
+    boot_id, cursor = watermark
+    stdout = strategy.shell.run_check(_FETCH.format(boot_id=boot_id, cursor=cursor))
+    entries = [json.loads(line) for line in stdout if line.startswith("{")]
+    if not entries:
+        return [], watermark
+
+    last = entries[-1]
+    if last["_BOOT_ID"] != boot_id:
+        # The watermark of another boot was replaced by the last message of this boot
+        return [], (last["_BOOT_ID"], last["__CURSOR"])
+
+    warnings = [str(e["MESSAGE"]) for e in entries if int(e.get("PRIORITY", MAX_PRIORITY + 1)) <= MAX_PRIORITY]
+    return warnings, (last["_BOOT_ID"], last["__CURSOR"])
+
+
+@pytest.fixture(autouse=True)
+def kernel_log(request: pytest.FixtureRequest, strategy, record_property):
+    """
+    Attribute new kernel warnings to the test that produced them.
+
+    A watermark (boot id and journal cursor of the last kernel message) is taken before the test.
+    After the test only the warnings logged since the watermark are fetched, emitted to the log with level WARNING
+    and added to the `junit.xml`.
+    The watermark taken after a test is reused for the next test, if the strategy did not transition in between.
+
+    Only tests that start and end in the shell state are checked.
+    Warnings logged during a reboot are not attributed to any test.
+    """
+    config = request.config
+    if config.getoption("no_kernel_log"):
+        yield
+        return
+
+    # Let the shell fixture transition to the shell first, so the watermark is taken in the state the test runs in
+    if "shell" in request.fixturenames:
+        request.getfixturevalue("shell")
+
+    if strategy.status != Status.shell:
+        yield
+        return
+
+    transitions, *watermark = config.stash.get(_watermark_key, (-1, "", ""))
+    if transitions != strategy.transition_count:
+        _, watermark = _fetch(strategy, ("", ""))
+
+    yield
+
+    if strategy.status != Status.shell:
+        config.stash.pop(_watermark_key, None)
+        return
+
+    warnings, watermark = _fetch(strategy, watermark)
+    config.stash[_watermark_key] = (strategy.transition_count, *watermark)
+
+    if warnings:
+        record_property("kernel-warnings", warnings)
+        for warning in warnings:
+            _kl_logger.warning(f"{request.node.nodeid}: {warning}")
@@ -1,9 +1,15 @@
 import enum
+import json
+import os
+import shlex
 
 import attr
 from labgrid import step, target_factory
 from labgrid.driver import ExecutionError
+from labgrid.resource.common import NetworkResource
 from labgrid.strategy import Strategy, StrategyError
+from labgrid.util.managedfile import ManagedFile
+from labgrid.util.ssh import sshmanager
 
 # Possible state transitions:
 #
@@ -14,6 +20,37 @@ from labgrid.strategy import Strategy, StrategyError
 # 1) Via bootstrap() but only once
 
 
+# Facts about the DUT that can not change while it is running.
+# They are fetched together on the first lookup after each boot, see LXATACStrategy.fact().
+FACTS = {
+    "boot-id": "cat /proc/sys/kernel/random/boot_id",
+    "uname": "uname -a",
+    "os-release": "cat /etc/os-release",
+    "buildinfo": "cat /etc/buildinfo",
+    # Only static information like the booted slot must be read from this fact
+    "rauc-status": "rauc status --output-format=json",
+    "lsblk-mmcblk1": "lsblk -b --json /dev/mmcblk1",
+    "i2c-1-0033-name": "cat /sys/bus/i2c/devices/1-0033/name",
+    "i2c-2-002c-name": "cat /sys/bus/i2c/devices/2-002c/name",
+    "spi1.0-fb0-name": "cat /sys/bus/spi/devices/spi1.0/graphics/fb0/name",
+}
+
+# Facts that are too large to transfer them with the other facts over the serial console.
+# They are fetched on their own, on the first lookup of each of them after each boot.
+LAZY_FACTS = {
+    # Only the rates of fixed clocks must be read from this fact, e.g. not the rate of the CPU clock
+    "clk_summary": "cat /sys/kernel/debug/clk/clk_summary",
+}
+
+# Runs the commands given as JSON object and prints their output and return codes as JSON object
+_FETCH_FACTS = (
+    "import json, subprocess, sys; "
+    "r = {k: subprocess.run(c, shell=True, capture_output=True, text=True) "
+    "for k, c in json.loads(sys.argv[1]).items()}; "
+    "print(json.dumps({k: [p.stdout.splitlines(), p.returncode] for k, p in r.items()}))"
+)
+
+
 class Status(enum.Enum):
     unknown = 0
     off = 1
@@ -46,6 +83,10 @@ class LXATACStrategy(Strategy):
     status = attr.ib(default=Status.unknown)
     mmc_bootstrapped = attr.ib(default=False)
     first_boot = attr.ib(default=True)
+    transition_count = attr.ib(default=0)
+    _transition_depth = attr.ib(default=0, init=False)
+    staged = attr.ib(factory=dict)
+    facts = attr.ib(factory=dict)
 
     @property
     def target_hostname(self):
@@ -91,6 +132,68 @@ class LXATACStrategy(Strategy):
         self.mmc_bootstrapped = True
         self.first_boot = True
 
+    @step(args=["filename"], result=True)
+    def stage(self, filename):
+        """
+        Make `filename` available via the HTTPProvider and return its URL.
+
+        Staged files are content-addressed: the URL contains the SHA256 of the file.
+        Each file is only hashed once per session and the upload is skipped, if the provider already holds
+        a file with the same hash.
+        """
+        filename = os.path.realpath(filename)
+        if filename in self.staged:
+            return self.staged[filename]
+
+        self.target.activate(self.httpprovider)
+        provider = self.httpprovider.provider
+
+        mf = ManagedFile(filename, provider)
+        symlink = os.path.join(provider.internal, mf.get_hash(), os.path.basename(filename))
+
+        if isinstance(provider, NetworkResource):
+            conn = sshmanager.open(provider.host)
+            cached = f"{mf.get_user_cache_path()}/{mf.get_hash()}/{os.path.basename(filename)}"
+            # Compare the size to detect incomplete uploads.
+            stdout, _, returncode = conn.run(f"stat --format %s {cached}")
+            if returncode == 0 and stdout == [str(os.path.getsize(filename))]:
+                conn.run_check(f"mkdir -p {os.path.dirname(symlink)} && ln -sfn {cached} {symlink}")
+            else:
+                mf.sync_to_resource(symlink=symlink)
+        else:
+            mf.sync_to_resource(symlink=symlink)
+
+        self.staged[filename] = provider.external + symlink[len(provider.internal) :]
+        return self.staged[filename]
+
+    @step(args=["names"])
+    def fetch_facts(self, names):
+        """Fetch the facts `names` from `FACTS` or `LAZY_FACTS` from the DUT in a single command."""
+        commands = {name: (FACTS | LAZY_FACTS)[name] for name in names}
+        stdout = self.shell.run_check(
+            f"python3 -c {shlex.quote(_FETCH_FACTS)} {shlex.quote(json.dumps(commands))}", timeout=90
+        )
+        self.facts.update(json.loads("".join(stdout)))
+
+    def fact(self, name):
+        """
+        Return the output of the command for fact `name` from `FACTS` or `LAZY_FACTS`.
+
+        The facts are cached until the next transition, i.e. for the current boot of the DUT.
+        All `FACTS` are fetched on the first lookup of any of them, each of the `LAZY_FACTS` on its own.
+        Raises an ExecutionError if the command failed.
+        """
+        if self.status != Status.shell:
+            raise StrategyError(f"can not read facts in state {self.status}")
+
+        if name not in self.facts:
+            self.fetch_facts([name] if name in LAZY_FACTS else list(FACTS))
+
+        stdout, returncode = self.facts[name]
+        if returncode != 0:
+            raise ExecutionError((FACTS | LAZY_FACTS)[name], stdout=stdout)
+        return stdout
+
     def wait_online(self):
         self.shell.poll_until_success("ping -c1 _gateway", timeout=60.0)
 
@@ -107,75 +210,83 @@ class LXATACStrategy(Strategy):
 
     @step(args=["status"])
     def transition(self, status, *, step):
-        if not isinstance(status, Status):
-            status = Status[status]
+        # Transitions call themselves for the intermediate states, only count the outermost call
+        self._transition_depth += 1
+        try:
+            if not isinstance(status, Status):
+                status = Status[status]
 
-        if status == Status.unknown:
-            raise StrategyError(f"can not transition to {status}")
+            if status == Status.unknown:
+                raise StrategyError(f"can not transition to {status}")
 
-        elif status == self.status:
-            step.skip("nothing to do")
-            return
+            elif status == self.status:
+                step.skip("nothing to do")
+                return
 
-        elif status == Status.off:
-            if self.status == Status.shell:
-                # Cleanly shut down the labgrid exporter to help the
-                # coordinator clean up stale resources.
-                self.shell.run("systemctl stop labgrid-exporter", timeout=90)
+            elif status == Status.off:
+                if self.status == Status.shell:
+                    # Cleanly shut down the labgrid exporter to help the
+                    # coordinator clean up stale resources.
+                    self.shell.run("systemctl stop labgrid-exporter", timeout=90)
 
-            self.target.deactivate(self.barebox)
-            self.target.deactivate(self.shell)
-            self.target.deactivate(self.fastboot)
+                self.target.deactivate(self.barebox)
+                self.target.deactivate(self.shell)
+                self.target.deactivate(self.fastboot)
 
-            self.target.activate(self.power)
-            self.power.off()
+                self.target.activate(self.power)
+                self.power.off()
 
-            # assure the board is not jumpered for dfu mode
-            self.target.activate(self.dfu_mode)
-            self.dfu_mode.set(False)
+                # assure the board is not jumpered for dfu mode
+                self.target.activate(self.dfu_mode)
+                self.dfu_mode.set(False)
 
-            self.target.activate(self.console)
+                self.target.activate(self.console)
 
-            self.activate_optionals()
+                self.activate_optionals()
 
-        elif status == Status.bootstrap:
-            self.transition(Status.off)
+            elif status == Status.bootstrap:
+                self.transition(Status.off)
 
-            if not self.mmc_bootstrapped:
-                self.bootstrap()
+                if not self.mmc_bootstrapped:
+                    self.bootstrap()
 
-        elif status == Status.barebox:
-            self.transition(Status.bootstrap)
+            elif status == Status.barebox:
+                self.transition(Status.bootstrap)
 
-            # cycle power
-            self.power.cycle()
-            # interrupt barebox
-            self.target.activate(self.barebox)
-            self.barebox.run_check("global linux.bootargs.loglevel=loglevel=6")
+                # cycle power
+                self.power.cycle()
+                # interrupt barebox
+                self.target.activate(self.barebox)
+                self.barebox.run_check("global linux.bootargs.loglevel=loglevel=6")
 
-        elif status == Status.shell:
-            # transition to barebox
-            self.transition(Status.barebox)
+            elif status == Status.shell:
+                # transition to barebox
+                self.transition(Status.barebox)
 
-            self.barebox.boot("")
-            self.barebox.await_boot()
+                self.barebox.boot("")
+                self.barebox.await_boot()
 
-            # The first boot takes quite some time because the eMMC is
-            # re-partitioned, filesystems are created and then the TAC reboots.
-            # Subsequent boots are faster and do not need the long timeout.
-            self.shell.login_timeout = 300 if self.first_boot else 60
+                # The first boot takes quite some time because the eMMC is
+                # re-partitioned, filesystems are created and then the TAC reboots.
+                # Subsequent boots are faster and do not need the long timeout.
+                self.shell.login_timeout = 300 if self.first_boot else 60
 
-            self.target.activate(self.shell)
-            self.wait_system_ready()
-            self.wait_online()
+                self.target.activate(self.shell)
+                self.wait_system_ready()
+                self.wait_online()
 
-            # Use shorter boot timeout for subsequent boots.
-            self.first_boot = False
+                # Use shorter boot timeout for subsequent boots.
+                self.first_boot = False
 
-        else:
-            raise StrategyError(f"no transition found from {self.status} to {status}")
+            else:
+                raise StrategyError(f"no transition found from {self.status} to {status}")
 
-        self.status = status
+            self.status = status
+            self.facts = {}
+            if self._transition_depth == 1:
+                self.transition_count += 1
+        finally:
+            self._transition_depth -= 1
 
     @step(args=["status"])
     def force(self, status):
@@ -197,6 +308,7 @@ class LXATACStrategy(Strategy):
 
         self.mmc_bootstrapped = True
         self.status = status
+        self.facts = {}
 
     def activate_optionals(self):
         if self.eet:
@@ -211,6 +323,13 @@ class LXATACStrategy(Strategy):
         def get_info(shell, command):
             pm_info[command] = shell.run_check(command)
 
+        def get_fact(name):
+            # Do not fetch all facts just for the post-mortem information
+            if name in self.facts and self.facts[name][1] == 0:
+                pm_info[FACTS[name]] = self.facts[name][0]
+            else:
+                get_info(self.shell, FACTS[name])
+
         if self.status == Status.barebox:
             get_info(self.barebox, "version")
             get_info(self.barebox, "mount")
@@ -218,9 +337,9 @@ class LXATACStrategy(Strategy):
             get_info(self.barebox, "nv")
             get_info(self.barebox, "dmesg")
         elif self.status == Status.shell:
-            get_info(self.shell, "uname -a")
-            get_info(self.shell, "cat /etc/os-release")
-            get_info(self.shell, "cat /etc/buildinfo")
+            get_fact("uname")
+            get_fact("os-release")
+            get_fact("buildinfo")
             get_info(self.shell, "dmesg -l 5")
             get_info(self.shell, "findmnt")
             get_info(self.shell, "lsns")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Run the test suite distributed across multiple LXA TAC places.
+
+Every labgrid environment given via `--env` describes one place.
+The tests are collected once and distributed to one worker per place.
+Tests are only assigned to places providing the features the tests require via `pytest.mark.lg_feature`.
+Tests chained via `pytest.mark.dependency` are always run by the same worker.
+The tests are balanced across the workers using the test durations of previous runs recorded in the
+duration history (see `--duration-history`).
+
+Each worker locks its place, runs its share of the tests in a separate `pytest` session and unlocks
+the place afterward.
+The junit reports of all workers are merged into a single report.
+
+Example:
+
+    ./parallel.py --env lxatac-00034.yaml --env lxatac-00035.yaml --junitxml=report.xml -- -vv tests/
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+
+import pytest
+
+import sharding
+
+
+@dataclass
+class Unit:
+    """Tests that have to be run together by a single worker."""
+
+    nodeids: list[str]
+    features: set[str]
+
+
+@dataclass
+class Worker:
+    env: str
+    features: set[str]
+    units: list[Unit] = field(default_factory=list)
+    predicted: float = 0.0
+    actual: float = 0.0
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.env))[0]
+
+    @property
+    def nodeids(self):
+        return [nodeid for unit in self.units for nodeid in unit.nodeids]
+
+
+class _Collector:
+    """pytest plugin to collect the tests and group them into units."""
+
+    def __init__(self):
+        self.units: list[Unit] = []
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, config, items):
+        for group in sharding.dependency_groups(items):
+            self.units.append(
+                Unit(
+                    nodeids=[item.nodeid for item in group],
+                    features=set().union(*(sharding.features(item) for item in group)),
+                )
+            )
+
+
+def collect(pytest_args: list[str]) -> list[Unit]:
+    collector = _Collector()
+    ret = pytest.main(["--collect-only", "-qq", *pytest_args], plugins=[collector])
+    if ret != pytest.ExitCode.OK:
+        sys.exit(f"Collecting tests failed: {ret!r}")
+    return collector.units
+
+
+def place_features(env: str) -> set[str]:
+    """Return the features of the place described by the labgrid environment `env`."""
+    # Import labgrid only after collecting the tests, so pytest can still rewrite the asserts in its plugin.
+    from labgrid.config import Config
+
+    config = Config(env)
+    features = config.get_features()
+    for target in config.get_targets().values():
+        features |= set(target.get("features", {}))
+    return features
+
+
+def distribute(units: list[Unit], workers: list[Worker], history: sharding.DurationHistory):
+    """
+    Assign the units to the workers providing the required features, balanced by their predicted duration.
+    Tests no place is capable of are skipped by labgrid anyway, any worker can report them.
+    """
+    bins, loads = sharding.pack(
+        units,
+        len(workers),
+        cost=lambda unit: sum(history.predict(nodeid) for nodeid in unit.nodeids),
+        allowed=lambda unit, index: unit.features <= workers[index].features,
+    )
+    for worker, assigned, load in zip(workers, bins, loads, strict=True):
+        # Keep the collection order inside each worker.
+        worker.units = sorted(assigned, key=units.index)
+        worker.predicted = load
+
+
+def run_workers(workers: list[Worker], pytest_args: list[str], log_dir: str) -> dict[str, int]:
+    # Lock the place, run the tests and unlock the place again, even if pytest failed.
+    # labgrid-client and the labgrid pytest plugin both pick up the environment from LG_ENV.
+    script = 'labgrid-client lock || exit 3; pytest "$@"; ret=$?; labgrid-client unlock; exit $ret'
+
+    start = time.monotonic()
+    with contextlib.ExitStack() as stack:
+        processes = {}
+        for worker in workers:
+            if not worker.nodeids:
+                print(f"{worker.name}: no tests to run")
+                continue
+
+            shard_file = os.path.join(log_dir, f"{worker.name}-shard.json")
+            with open(shard_file, "w") as f:
+                json.dump(worker.nodeids, f, indent=2)
+
+            durations_file = os.path.join(log_dir, f"{worker.name}-durations.json")
+            if os.path.exists(durations_file):
+                os.remove(durations_file)
+
+            args = [
+                "sh",
+                "-c",
+                script,
+                "worker",
+                *pytest_args,
+                f"--shard-file={shard_file}",
+                f"--duration-history={durations_file}",
+                f"--junitxml={os.path.join(log_dir, worker.name + '.xml')}",
+            ]
+            log = stack.enter_context(open(os.path.join(log_dir, f"{worker.name}.log"), "w"))
+            print(
+                f"{worker.name}: running {len(worker.nodeids)} tests (predicted {worker.predicted:.0f} s), "
+                f"see {log.name}"
+            )
+            processes[worker.name] = subprocess.Popen(
+                args, stdout=log, stderr=subprocess.STDOUT, env={**os.environ, "LG_ENV": worker.env}
+            )
+
+        results = {}
+        while len(results) < len(processes):
+            time.sleep(1)
+            for worker in workers:
+                process = processes.get(worker.name)
+                if worker.name in results or process is None or process.poll() is None:
+                    continue
+                results[worker.name] = process.returncode
+                worker.actual = time.monotonic() - start
+                print(f"{worker.name}: pytest exited with {results[worker.name]} after {worker.actual:.0f} s")
+
+    return results
+
+
+def merge_junit(workers: list[Worker], log_dir: str, junitxml: str):
+    """Merge the junit reports of all workers into a single report with one testsuite per place."""
+    merged = ET.Element("testsuites", name="pytest tests")
+    totals = dict.fromkeys(("tests", "errors", "failures", "skipped"), 0)
+    duration = 0.0
+
+    for worker in workers:
+        path = os.path.join(log_dir, worker.name + ".xml")
+        if not os.path.exists(path):
+            continue
+
+        for suite in ET.parse(path).getroot().iter("testsuite"):
+            suite.set("name", worker.name)
+            for key in totals:
+                totals[key] += int(suite.get(key, 0))
+            duration = max(duration, float(suite.get("time", 0)))
+            merged.append(suite)
+
+    for key, value in totals.items():
+        merged.set(key, str(value))
+    merged.set("time", f"{duration:.3f}")
+
+    ET.ElementTree(merged).write(junitxml, encoding="utf-8", xml_declaration=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--env",
+        action="append",
+        required=True,
+        help="labgrid environment of a place to run tests on. Can be given multiple times.",
+    )
+    parser.add_argument("--junitxml", default="junit.xml", help="path of the merged junit report")
+    parser.add_argument("--log-dir", default="parallel", help="directory for worker logs and reports")
+    parser.add_argument(
+        "--duration-history",
+        default="duration-history.json",
+        help="JSON file with the test durations of previous runs, updated after the run",
+    )
+    parser.add_argument("pytest_args", nargs="*", help="arguments passed to pytest (after --)")
+    args = parser.parse_args()
+
+    os.makedirs(args.log_dir, exist_ok=True)
+
+    history = sharding.DurationHistory(args.duration_history)
+    units = collect(args.pytest_args)
+    workers = [Worker(env=env, features=place_features(env)) for env in args.env]
+    distribute(units, workers, history)
+
+    results = run_workers(workers, args.pytest_args, args.log_dir)
+    merge_junit(workers, args.log_dir, args.junitxml)
+    print(f"Merged junit report written to {args.junitxml}")
+
+    for worker in workers:
+        history.merge(sharding.DurationHistory(os.path.join(args.log_dir, f"{worker.name}-durations.json")))
+    history.save()
+
+    predicted = max(worker.predicted for worker in workers)
+    actual = max(worker.actual for worker in workers)
+    print(f"Makespan: predicted {predicted:.0f} s, actual {actual:.0f} s")
+
+    sys.exit(max(results.values(), default=pytest.ExitCode.NO_TESTS_COLLECTED))
+
+
+if __name__ == "__main__":
+    main()
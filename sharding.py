@@ -0,0 +1,223 @@
+import json
+import os
+import statistics
+from collections.abc import Callable
+from time import monotonic
+from typing import TypeVar
+
+import pytest
+from pytest import StashKey
+
+from stateorder import dependencies
+
+T = TypeVar("T")
+
+# Duration assumed for tests without any recorded history
+DEFAULT_DURATION = 30.0
+
+# Number of recorded runs per test used to predict its duration
+HISTORY_LENGTH = 5
+
+_session_key = StashKey[dict[str, dict]]()
+_shard_key = StashKey[tuple[int, int, list[float], float]]()
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--shard-file",
+        help="Only run the tests listed in this JSON file. Used by parallel.py to distribute tests.",
+    )
+    parser.addoption(
+        "--shard",
+        help="Only run shard I of N (given as I/N, starting at 1). Shards are balanced using --duration-history.",
+    )
+    parser.addoption(
+        "--duration-history",
+        help="JSON file to record the test durations and strategy transitions in. "
+        "Also used to balance the shards selected via --shard.",
+    )
+
+
+class DurationHistory:
+    """
+    Durations and strategy transitions of previous test runs, stored as JSON file.
+    For each test the last `HISTORY_LENGTH` runs are kept.
+    """
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self.tests: dict[str, dict[str, list]] = {}
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.tests = json.load(f)
+
+    def record(self, nodeid: str, duration: float, transitions: int):
+        entry = self.tests.setdefault(nodeid, {"durations": [], "transitions": []})
+        entry["durations"] = (entry["durations"] + [duration])[-HISTORY_LENGTH:]
+        entry["transitions"] = (entry["transitions"] + [transitions])[-HISTORY_LENGTH:]
+
+    def merge(self, other: "DurationHistory"):
+        for nodeid, entry in other.tests.items():
+            for duration, transitions in zip(entry["durations"], entry["transitions"], strict=True):
+                self.record(nodeid, duration, transitions)
+
+    def predict(self, nodeid: str) -> float:
+        """
+        Predict the duration of a test.
+        Tests without history are assumed to take as long as the median test.
+        """
+        if nodeid in self.tests:
+            return statistics.mean(self.tests[nodeid]["durations"])
+
+        known = [statistics.mean(e["durations"]) for e in self.tests.values()]
+        return statistics.median(known) if known else DEFAULT_DURATION
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump(self.tests, f, indent=2, sort_keys=True)
+
+
+def features(item: pytest.Item) -> set[str]:
+    """Return the labgrid features `item` requires via `pytest.mark.lg_feature`."""
+    wanted = set()
+    for marker in item.iter_markers("lg_feature"):
+        if isinstance(marker.args[0], str):
+            wanted.add(marker.args[0])
+        else:
+            wanted.update(marker.args[0])
+    return wanted
+
+
+def dependency_groups(items: list[pytest.Item]) -> list[list[pytest.Item]]:
+    """
+    Split `items` into groups that must be run in the same session,
+    because they are chained via `pytest.mark.dependency`.
+    The order of the groups and of the items inside each group is kept.
+    """
+    parent = {item: item for item in items}
+
+    def find(item):
+        while parent[item] is not item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for item, required in dependencies(items).items():
+        for r in required:
+            parent[find(item)] = find(r)
+
+    groups: dict[pytest.Item, list[pytest.Item]] = {}
+    for item in items:
+        groups.setdefault(find(item), []).append(item)
+
+    return list(groups.values())
+
+
+def pack(
+    units: list[T], shards: int, cost: Callable[[T], float], allowed: Callable[[T, int], bool] = lambda u, s: True
+) -> tuple[list[list[T]], list[float]]:
+    """
+    Distribute `units` to `shards` bins, so that the largest sum of `cost` of a bin is small.
+    Uses the longest-processing-time-first heuristic:
+    Units are assigned from the most to the least expensive, each to the least loaded bin it is `allowed` in.
+    If a unit is not allowed in any bin, it is assigned to the least loaded bin.
+
+    Returns the units and the predicted load of each bin.
+    """
+    bins: list[list[T]] = [[] for _ in range(shards)]
+    loads = [0.0] * shards
+
+    for unit in sorted(units, key=cost, reverse=True):
+        candidates = [s for s in range(shards) if allowed(unit, s)] or range(shards)
+        shard = min(candidates, key=lambda s: loads[s])
+        bins[shard].append(unit)
+        loads[shard] += cost(unit)
+
+    return bins, loads
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(config, items):
+    """Deselect all tests that are not part of the shard given via `--shard-file` or `--shard`."""
+    selected = None
+
+    if config.getoption("shard_file"):
+        with open(config.getoption("shard_file")) as f:
+            selected = set(json.load(f))
+
+    elif config.getoption("shard"):
+        try:
+            index, count = (int(x) for x in config.getoption("shard").split("/"))
+        except ValueError:
+            raise pytest.UsageError("--shard expects I/N, e.g. --shard=1/4") from None
+        if not 1 <= index <= count:
+            raise pytest.UsageError(f"--shard: shard {index} does not exist in {count} shards")
+
+        history = DurationHistory(config.getoption("duration_history"))
+        bins, loads = pack(
+            dependency_groups(items), count, cost=lambda group: sum(history.predict(i.nodeid) for i in group)
+        )
+        selected = {item.nodeid for group in bins[index - 1] for item in group}
+        config.stash[_shard_key] = (index, count, loads, monotonic())
+
+    if selected is None:
+        return
+
+    deselected = [item for item in items if item.nodeid not in selected]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = [item for item in items if item.nodeid in selected]
+
+
+def pytest_configure(config):
+    config.stash[_session_key] = {}
+    # Counting transitions requires the strategy, so only do it if the counts are recorded
+    if config.getoption("duration_history"):
+        config.pluginmanager.register(TransitionCounter(), "sharding-transition-counter")
+
+
+def _session_entry(item: pytest.Item) -> dict:
+    return item.config.stash[_session_key].setdefault(item.nodeid, {"duration": 0.0, "transitions": 0})
+
+
+class TransitionCounter:
+    """Registered as plugin if `--duration-history` is given."""
+
+    @pytest.fixture(autouse=True)
+    def transition_counter(self, request, strategy):
+        """Count the strategy transitions caused by the setup, call and teardown of a test."""
+        before = strategy.transition_count
+        yield
+        _session_entry(request.node)["transitions"] = strategy.transition_count - before
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_makereport(item: pytest.Item, call: pytest.CallInfo[None]):
+    """Sum up the durations of the setup, call and teardown phases of each test."""
+    rep = yield
+    _session_entry(item)["duration"] += rep.duration
+    return rep
+
+
+def pytest_sessionfinish(session):
+    path = session.config.getoption("duration_history")
+    if not path:
+        return
+
+    history = DurationHistory(path)
+    for nodeid, entry in session.config.stash[_session_key].items():
+        history.record(nodeid, entry["duration"], entry["transitions"])
+    history.save()
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if _shard_key not in config.stash:
+        return
+
+    index, count, loads, start = config.stash[_shard_key]
+    terminalreporter.write_sep("-", "shard")
+    terminalreporter.write_line(
+        f"shard {index}/{count}: predicted {loads[index - 1]:.0f} s (makespan of all shards {max(loads):.0f} s), "
+        f"actual {monotonic() - start:.0f} s"
+    )
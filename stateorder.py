@@ -0,0 +1,157 @@
+import pytest
+from pytest import StashKey
+
+# Fixtures that pin a test to a strategy state.
+# Each entry maps the fixture name to the state it transitions into during setup and the state the
+# strategy is left in after teardown.
+_STATE_FIXTURES = {
+    "shell": ("shell", "shell"),
+    "barebox": ("barebox", "barebox"),
+    "default_bootstate": ("barebox", "barebox"),
+}
+
+# Groups in the order they are run.
+# Tests using `default_bootstate` start from the shell (e.g. via `booted_slot`), but leave the
+# strategy in barebox. So they are run after the shell tests and before the barebox tests.
+# `prepare_network` and `can_configured` reconfigure the running system and are kept together.
+_GROUPS = (
+    "can_configured",
+    "prepare_network",
+    "shell",
+    "default_bootstate",
+    "barebox",
+)
+
+# A test is put into the group of the first fixture from this list it uses.
+_GROUP_PRECEDENCE = (
+    "default_bootstate",
+    "barebox",
+    "prepare_network",
+    "can_configured",
+    "shell",
+)
+
+_transitions_key = StashKey[tuple[int, int]]()
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--state-order",
+        action="store_true",
+        help="Reorder the tests into groups that require the same strategy state to minimise transitions.",
+    )
+
+
+def state_group(item: pytest.Item) -> int:
+    """Return the rank of the group `item` is run in."""
+    for fixture in _GROUP_PRECEDENCE:
+        if fixture in item.fixturenames:
+            return _GROUPS.index(fixture)
+
+    # Tests without any state fixture do not care about the state. Run them with the shell tests.
+    return _GROUPS.index("shell")
+
+
+def states(item: pytest.Item) -> tuple[str | None, str | None]:
+    """
+    Return the strategy state `item` needs at setup and the state it leaves the strategy in.
+    The states are `None` if the test does not use any of the state fixtures.
+    """
+    used = [_STATE_FIXTURES[f] for f in item.fixturenames if f in _STATE_FIXTURES]
+    if not used:
+        return None, None
+
+    # `fixturenames` is the fixture closure in the order the fixtures are set up.
+    # The last state fixture decides in which state the strategy is left in after teardown.
+    return used[0][0], used[-1][1]
+
+
+def count_transitions(items: list[pytest.Item]) -> int:
+    """Count the transitions between shell and barebox needed to run `items` in this order."""
+    transitions = 0
+    current = None
+
+    for item in items:
+        entry, exit_ = states(item)
+        if entry is None:
+            continue
+        if current is not None and entry != current:
+            transitions += 1
+        current = exit_
+
+    return transitions
+
+
+def dependencies(items: list[pytest.Item]) -> dict[pytest.Item, list[pytest.Item]]:
+    """
+    Resolve the `pytest.mark.dependency` markers of `items`.
+    Returns a mapping of each item to the items it depends on (if these are part of `items`).
+    """
+    by_name = {}
+    for item in items:
+        marker = item.get_closest_marker("dependency")
+        local_name = item.nodeid.split("::", 1)[-1]
+        names = {item.nodeid, (item.module.__name__, local_name)}
+        if marker and "name" in marker.kwargs:
+            names.add(marker.kwargs["name"])
+            names.add((item.module.__name__, marker.kwargs["name"]))
+        for name in names:
+            by_name[name] = item
+
+    deps = {}
+    for item in items:
+        marker = item.get_closest_marker("dependency")
+        if not marker:
+            continue
+
+        scope = marker.kwargs.get("scope", "module")
+        for name in marker.kwargs.get("depends", ()):
+            key = (item.module.__name__, name) if scope == "module" else name
+            if key in by_name:
+                deps.setdefault(item, []).append(by_name[key])
+
+    return deps
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(config, items):
+    """
+    Sort the collected tests by the strategy state they need.
+
+    The order of tests inside a group is kept.
+    Tests marked with `pytest.mark.dependency` are never moved in front of the tests they depend on.
+    """
+    if not config.getoption("state_order"):
+        return
+
+    before = count_transitions(items)
+
+    rank = {item: state_group(item) for item in items}
+    deps = dependencies(items)
+
+    # Move dependent tests into the group of their dependencies if needed,
+    # until the ranks do not change anymore.
+    changed = True
+    while changed:
+        changed = False
+        for item, required in deps.items():
+            needed = max(rank[r] for r in required)
+            if needed > rank[item]:
+                rank[item] = needed
+                changed = True
+
+    position = {item: index for index, item in enumerate(items)}
+    items.sort(key=lambda item: (rank[item], position[item]))
+
+    config.stash[_transitions_key] = (before, count_transitions(items))
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if _transitions_key not in config.stash:
+        return
+
+    before, after = config.stash[_transitions_key]
+    terminalreporter.write_sep("-", "state order")
+    terminalreporter.write_line(
+        f"shell/barebox transitions: {before} in collection order, {after} after reordering ({before - after} saved)"
+    )
@@ -0,0 +1,110 @@
+import json
+import statistics
+import time
+
+import pytest
+from pytest import StashKey
+
+from lxatacstrategy import Status
+
+# The sampler takes one sample per INTERVAL seconds into a ring buffer of two files of SIZE samples each.
+INTERVAL = 1.0
+SIZE = 600
+UNIT = "lxatac-telemetry"
+PREFIX = "/tmp/telemetry"
+
+_sampler_key = StashKey[dict]()
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--telemetry",
+        action="store_true",
+        help="Sample CPU, memory, temperature, eMMC and network statistics on the DUT in the background "
+        "and attach a summary for the duration of each test to the test.",
+    )
+
+
+def _start_sampler(strategy) -> dict:
+    """Start the sampler (once per boot) and determine the offset of the DUT's clock to the host's clock."""
+    # `helper` lives in the tests directory, which is only on the path once the tests are collected.
+    import helper
+
+    shell = strategy.shell
+    _, _, returncode = shell.run(f"systemctl is-active --quiet {UNIT}")
+    if returncode != 0:
+        shell.run_check(f"systemctl reset-failed {UNIT} 2>/dev/null; rm -f {PREFIX}.a {PREFIX}.b; true")
+        script = helper.install_script(shell, "telemetry-sampler.py")
+        shell.run_check(f"systemd-run --unit={UNIT} {script} {PREFIX} {INTERVAL} {SIZE}")
+
+    before = time.time()
+    [now] = shell.run_check("date +%s.%N")
+    after = time.time()
+
+    return {
+        "transitions": strategy.transition_count,
+        "offset": float(now) - (before + after) / 2,
+        "samples": [],
+    }
+
+
+def _fetch(strategy, sampler: dict):
+    """Fetch the samples taken since the last fetch from the ring buffer."""
+    last = sampler["samples"][-1]["time"] if sampler["samples"] else 0
+    # "time" is the first key of each sample
+    stdout = strategy.shell.run_check(
+        f"cat {PREFIX}.b {PREFIX}.a 2>/dev/null | awk -F '[:,]' '$2 > {last}'", timeout=60
+    )
+    sampler["samples"] += [json.loads(line) for line in stdout if line.startswith("{")]
+
+
+def summarize(samples: list[dict]) -> dict:
+    """Summarize `samples` to the values of interest for a single test."""
+    first, last = samples[0], samples[-1]
+    return {
+        "samples": len(samples),
+        "cpu mean [%]": round(statistics.mean(s["cpu"] for s in samples), 1),
+        "cpu max [%]": max(s["cpu"] for s in samples),
+        "memory available min [MB]": round(min(s["mem_available"] for s in samples) / 1e6, 1),
+        "temperature max [°C]": max(s["temperature"] for s in samples),
+        "emmc read [MB]": round((last["emmc_read"] - first["emmc_read"]) / 1e6, 1),
+        "emmc written [MB]": round((last["emmc_written"] - first["emmc_written"]) / 1e6, 1),
+        "network rx [MB]": round((last["net_rx"] - first["net_rx"]) / 1e6, 1),
+        "network tx [MB]": round((last["net_tx"] - first["net_tx"]) / 1e6, 1),
+    }
+
+
+@pytest.fixture(autouse=True)
+def telemetry(request: pytest.FixtureRequest, strategy, record_property):
+    """
+    Attach a summary of the DUT's health during the test, sampled in the background, to the `junit.xml`.
+    Enabled via `--telemetry`.
+
+    The sampler is started on the DUT once per boot.
+    After each test the new samples are fetched in bulk and the samples taken during the test are summarized.
+    Only tests that start and end in the shell state are covered.
+    """
+    config = request.config
+    if not config.getoption("telemetry") or strategy.status != Status.shell:
+        yield
+        return
+
+    sampler = config.stash.get(_sampler_key, None)
+    if sampler is None or sampler["transitions"] != strategy.transition_count:
+        sampler = config.stash[_sampler_key] = _start_sampler(strategy)
+
+    start = time.time() + sampler["offset"]
+    yield
+    end = time.time() + sampler["offset"]
+
+    if strategy.status != Status.shell or sampler["transitions"] != strategy.transition_count:
+        return
+
+    _fetch(strategy, sampler)
+    # Keep one sample before the test, so the counters cover the whole test
+    earlier = [s for s in sampler["samples"] if s["time"] < start]
+    sampler["samples"] = earlier[-1:] + [s for s in sampler["samples"] if s["time"] >= start]
+    samples = [s for s in sampler["samples"] if s["time"] <= end]
+
+    if len(samples) >= 2:
+        record_property("telemetry", summarize(samples))
@@ -1,4 +1,9 @@
+import base64
+import hashlib
+import os
 import re
+import shlex
+from dataclasses import dataclass
 
 import labgrid.protocol
 
@@ -11,28 +16,286 @@ class SystemdRun:
     > with SystemdRun(command="sleep 30", shell=shell):
     >     pass
 
-    The output of the command is not collected.
-    Neither is the exit code.
+    A readiness condition can be given, which is a shell condition checked on the DUT until it is met, e.g. that the
+    command listens on a port (see `port()`, `file()` and `log()`). `{unit}` is replaced with the name of the unit:
+
+    > with SystemdRun(command="iperf3 -s -1 -p 5201", shell=shell, ready=SystemdRun.port(5201)):
+    >     shell.run_check("iperf3 -c 127.0.0.1 -p 5201")
+
+    The output of the command is collected in the journal and can be read via `output()`.
+    Use `wait()` to wait for the command to finish and get its exit code:
+
+    > with SystemdRun(command="candump -n1 can1", shell=shell) as candump:
+    >     shell.run_check("cansend can0_iobus 01a#11223344AABBCCDD")
+    >     assert candump.wait(timeout=5) == 0
+    >     print(candump.output())
 
     This is a workaround until something like https://github.com/labgrid-project/labgrid/pull/835 is merged.
     """
 
     _re_run = re.compile(r"^Running as unit: (run-[\w-]+\.service);")
 
-    def __init__(self, command: str, shell: labgrid.protocol.ConsoleProtocol):
+    def __init__(
+        self,
+        command: str,
+        shell: labgrid.protocol.ConsoleProtocol,
+        ready: str | None = None,
+        ready_timeout: float = 30.0,
+    ):
         """
         Run `command` in a transient unit using `systemd-run`.
+        If `ready` is given, entering the context waits for up to `ready_timeout` seconds until the condition is met.
         """
         self._command = command
         self._shell = shell
+        self._ready = ready
+        self._ready_timeout = ready_timeout
         self._unit = None
 
-    def __enter__(self) -> None:
-        stdout = self._shell.run_check(f"systemd-run {self._command}")
+    @staticmethod
+    def port(port: int, netns: str | None = None) -> str:
+        """Condition that something listens on TCP or UDP `port` (in the network namespace `netns`)."""
+        prefix = f"ip netns exec {netns} " if netns else ""
+        return f"{prefix}ss -Hlntu 'sport = :{port}' | grep -q ."
+
+    @staticmethod
+    def file(path: str) -> str:
+        """Condition that `path` exists."""
+        return f"test -e {path}"
+
+    @staticmethod
+    def log(pattern: str) -> str:
+        """Condition that the command logged a line matching the extended regular expression `pattern`."""
+        return f"journalctl _SYSTEMD_UNIT={{unit}} -o cat --no-pager | grep -qE {shlex.quote(pattern)}"
+
+    def _until(self, condition: str, timeout: float, what: str):
+        """Check `condition` on the DUT every 100 ms until it is met, for up to `timeout` seconds, in one command."""
+        script = f"until {condition}; do sleep 0.1; done"
+        _, _, returncode = self._shell.run(f"timeout {timeout} sh -c {shlex.quote(script)}", timeout=timeout + 10)
+        if returncode != 0:
+            raise TimeoutError(
+                f"{self._unit} ({self._command}): {what} within {timeout} s\n" + "\n".join(self.output())
+            )
+
+    def __enter__(self) -> "SystemdRun":
+        # Keep the unit after the command exited, so its exit code can be read. Remove it, once it is stopped.
+        stdout = self._shell.run_check(
+            f"systemd-run --property=RemainAfterExit=yes --property=CollectMode=inactive-or-failed {self._command}"
+        )
         match = SystemdRun._re_run.match("".join(stdout))
         if not match:
             raise ValueError(f"systemd-run returned not parseable output: {stdout}")
         self._unit = match[1]
 
+        if self._ready:
+            condition = self._ready.replace("{unit}", self._unit)
+            # Fail early if the command exits before it is ready
+            running = f'[ "$(systemctl show -p SubState --value {self._unit})" = running ] || exit 1'
+            try:
+                self._until(f"{{ {running}; }} && {condition}", self._ready_timeout, "not ready")
+            except Exception:
+                self.__exit__(None, None, None)
+                raise
+
+        return self
+
     def __exit__(self, _type, _value, _traceback):
         self._shell.run(f"systemctl stop {self._unit}")
+
+    def output(self) -> list[str]:
+        """Return the output of the command logged so far."""
+        # Make sure journald has processed the last lines logged by the command, e.g. right before it exited
+        return self._shell.run_check(f"journalctl --sync && journalctl _SYSTEMD_UNIT={self._unit} -o cat --no-pager")
+
+    def wait(self, timeout: float = 30.0) -> int:
+        """Wait for up to `timeout` seconds for the command to finish and return its exit code."""
+        self._until(f'[ "$(systemctl show -p SubState --value {self._unit})" != running ]', timeout, "did not finish")
+        [status] = self._shell.run_check(f"systemctl show -p ExecMainStatus --value {self._unit}")
+        return int(status)
+
+
+@dataclass(frozen=True)
+class NetnsTopology:
+    """
+    Declarative description of a network topology on the DUT that moves interfaces into a network namespace.
+
+    The topology is applied in one batch. If any step fails, the steps applied so far are undone.
+    Use it like this:
+
+    > topology = NetnsTopology(
+    >     namespace="test-namespace",
+    >     stop_services=("NetworkManager",),
+    >     addresses=(("uplink", "10.0.0.2/24"),),
+    >     namespace_addresses=(("dut", "10.0.0.1/24"),),
+    > )
+    > topology.apply(shell)
+    > assert topology.applied(shell)
+    > topology.teardown(shell)
+    """
+
+    namespace: str
+    # Services to stop while the topology is applied, e.g. because they manage the interfaces
+    stop_services: tuple[str, ...] = ()
+    # Links to delete while the topology is applied, e.g. bridges the interfaces are part of.
+    # These are expected to be recreated by the services in `stop_services`.
+    delete_links: tuple[str, ...] = ()
+    # (interface, address) tuples for interfaces in the default namespace
+    addresses: tuple[tuple[str, str], ...] = ()
+    # (interface, address) tuples for interfaces moved into `namespace`
+    namespace_addresses: tuple[tuple[str, str], ...] = ()
+
+    def _apply_steps(self) -> list[str]:
+        steps = [f"systemctl stop {service}" for service in self.stop_services]
+        steps += [f"ip link delete {link}" for link in self.delete_links]
+        steps.append(f"ip netns add {self.namespace}")
+        for ifname, address in self.namespace_addresses:
+            steps.append(f"ip link set {ifname} netns {self.namespace}")
+            steps.append(f"ip netns exec {self.namespace} ip link set dev {ifname} up")
+            steps.append(f"ip netns exec {self.namespace} ip addr add {address} dev {ifname}")
+        for ifname, address in self.addresses:
+            steps.append(f"ip link set dev {ifname} up")
+            steps.append(f"ip addr add {address} dev {ifname}")
+        return steps
+
+    def _teardown_steps(self) -> list[str]:
+        steps = [f"ip addr del {address} dev {ifname}" for ifname, address in self.addresses]
+        steps += [
+            f"ip netns exec {self.namespace} ip link set {ifname} netns 1" for ifname, _ in self.namespace_addresses
+        ]
+        steps.append(f"ip netns del {self.namespace}")
+        steps += [f"systemctl start {service}" for service in reversed(self.stop_services)]
+        return steps
+
+    def _check_steps(self) -> list[str]:
+        steps = [
+            f"ip netns exec {self.namespace} ip -brief addr show dev {ifname} | grep -qF ' {address}'"
+            for ifname, address in self.namespace_addresses
+        ]
+        steps += [f"ip -brief addr show dev {ifname} | grep -qF ' {address}'" for ifname, address in self.addresses]
+        return steps
+
+    def apply(self, shell: labgrid.protocol.ConsoleProtocol):
+        """Apply the topology. If a step fails, undo all steps (ignoring errors) and raise an ExecutionError."""
+        apply = " && ".join(self._apply_steps())
+        rollback = "; ".join(f"{step} 2>/dev/null" for step in self._teardown_steps())
+        shell.run_check(f"{{ {apply}; }} || {{ {rollback}; false; }}", timeout=60)
+
+    def applied(self, shell: labgrid.protocol.ConsoleProtocol) -> bool:
+        """Check if the topology is (still) applied with a single command."""
+        _, _, returncode = shell.run(" && ".join(self._check_steps()))
+        return returncode == 0
+
+    def teardown(self, shell: labgrid.protocol.ConsoleProtocol):
+        """Undo the topology in one batch."""
+        shell.run_check(" && ".join(self._teardown_steps()), timeout=60)
+
+
+class Pattern:
+    """
+    Deterministic test data that can be generated on the DUT and reproduced on the host.
+
+    The data consists of 64 byte records, each starting with its index.
+    So unlike random data it does not need to be hashed on the DUT and transferred to the host to verify a transfer,
+    and misplaced data can be recognized.
+    """
+
+    RECORD_SIZE = 64
+    _FILLER = "." * (RECORD_SIZE - 16)
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def command(self) -> str:
+        """Return a shell command that writes the pattern to stdout."""
+        records = -(-self.size // self.RECORD_SIZE)
+        return f"seq -f '%015.0f{self._FILLER}' 0 {records - 1} | head -c {self.size}"
+
+    def chunks(self, chunk_size: int = 1024 * 1024):
+        """Generate the pattern on the host in chunks of `chunk_size` bytes (except for the last one)."""
+        records_per_chunk = max(1, chunk_size // self.RECORD_SIZE)
+        index = 0
+        remaining = self.size
+        while remaining > 0:
+            chunk = "".join(f"{i:015d}{self._FILLER}\n" for i in range(index, index + records_per_chunk)).encode()
+            chunk = chunk[:remaining]
+            yield chunk
+            index += records_per_chunk
+            remaining -= len(chunk)
+
+    def sha256(self) -> str:
+        digest = hashlib.sha256()
+        for chunk in self.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+def cpu_times(shell: labgrid.protocol.ConsoleProtocol) -> tuple[int, int]:
+    """
+    Return the busy and the total CPU time (in jiffies, summed over all CPUs) from `/proc/stat`.
+    The CPU utilization over a period is the difference of the busy times divided by the difference of the totals.
+    """
+    [line] = shell.run_check("head -n 1 /proc/stat")
+    # cpu user nice system idle iowait irq softirq steal guest guest_nice
+    times = [int(t) for t in line.split()[1:9]]
+    idle = times[3] + times[4]
+    return sum(times) - idle, sum(times)
+
+
+class ThermalSampler:
+    """
+    Sample the SoC temperature and the frequency of CPU 0 once per second on the DUT in the background, e.g. while
+    a benchmark runs. Use it as context manager:
+
+    > with ThermalSampler(shell) as thermal:
+    >     shell.run_check("stress-ng --matrix 0 --timeout 10s")
+    > print(max(thermal.temperatures))
+
+    Each sample is a tuple of the time on the DUT (CLOCK_REALTIME in seconds), the temperature in °C and the CPU
+    frequency in MHz (0 if cpufreq is not available). The samples are available once the context is left.
+    """
+
+    _PATH = "/tmp/thermal-sampler"
+    _SAMPLER = (
+        "sh -c 'while true; do echo $(date +%s.%N) $(cat /sys/class/thermal/thermal_zone0/temp) "
+        "$(cat /sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq 2>/dev/null || echo 0); "
+        f"sleep 1; done > {_PATH}'"
+    )
+
+    def __init__(self, shell: labgrid.protocol.ConsoleProtocol):
+        self._shell = shell
+        self._run = SystemdRun(self._SAMPLER, shell, ready=SystemdRun.file(self._PATH))
+        self.samples: list[tuple[float, float, float]] = []
+
+    @property
+    def temperatures(self) -> list[float]:
+        return [temperature for _, temperature, _ in self.samples]
+
+    def __enter__(self) -> "ThermalSampler":
+        self._shell.run(f"rm -f {self._PATH}")
+        self._run.__enter__()
+        return self
+
+    def __exit__(self, _type, _value, _traceback):
+        self._run.__exit__(_type, _value, _traceback)
+        try:
+            stdout = self._shell.run_check(f"cat {self._PATH}")
+        finally:
+            self._shell.run(f"rm -f {self._PATH}")
+        self.samples = [(float(t), int(temp) / 1000, int(freq) / 1000) for t, temp, freq in map(str.split, stdout)]
+
+
+def install_script(shell: labgrid.protocol.ConsoleProtocol, name: str, path: str | None = None) -> str:
+    """
+    Copy the script `name` from `tests/scripts/` to the DUT via the console and make it executable.
+    The script is transferred base64 encoded in chunks, so it survives the console unchanged.
+    Returns the path of the script on the DUT (`/tmp/<name>` by default).
+    """
+    path = path or f"/tmp/{name}"
+    with open(os.path.join(os.path.dirname(__file__), "scripts", name), "rb") as f:
+        encoded = base64.b64encode(f.read()).decode()
+
+    shell.run_check(f"rm -f {path}.b64")
+    for offset in range(0, len(encoded), 512):
+        shell.run_check(f"echo {encoded[offset : offset + 512]} >> {path}.b64")
+    shell.run_check(f"base64 -d {path}.b64 > {path} && rm {path}.b64 && chmod +x {path}")
+    return path
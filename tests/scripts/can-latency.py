@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Evaluate a `candump -t a -x` log of frames sent on one CAN interface and received on another one.
+
+This script runs on the LXA TAC, so the (potentially long) log does not have to be transferred to the host.
+Each frame received on RX_INTERFACE is matched to the frame with the same ID and data sent on TX_INTERFACE.
+The latency of a frame is the time between the transmission on TX_INTERFACE (the TX echo of the sent frame) and the
+reception on RX_INTERFACE.
+The result is printed as JSON object.
+
+Usage: can-latency.py LOG TX_INTERFACE RX_INTERFACE
+"""
+
+import json
+import re
+import statistics
+import sys
+
+# e.g. " (1700000000.123456)  can0_iobus  TX - -  123   [8]  00 01 02 03 04 05 06 07"
+FRAME = re.compile(r"^\s*\((\d+\.\d+)\)\s+(\S+)\s+([RT]X)\s+\S+\s+\S+\s+([0-9A-F]+)\s+\[(\d+)\]\s*([0-9A-F ]*)$")
+
+
+def main():
+    log, tx_interface, rx_interface = sys.argv[1:4]
+
+    pending = {}
+    sent = 0
+    received = []
+    latencies = []
+
+    with open(log) as f:
+        for line in f:
+            match = FRAME.match(line)
+            if not match:
+                continue
+            timestamp, interface, direction, can_id, _, data = match.groups()
+            timestamp = float(timestamp)
+            key = (can_id, data.strip())
+
+            if interface == tx_interface and direction == "TX":
+                sent += 1
+                pending[key] = timestamp
+            elif interface == rx_interface and direction == "RX" and key in pending:
+                received.append(timestamp)
+                latencies.append(timestamp - pending.pop(key))
+
+    result = {"sent": sent, "received": len(received), "dropped": sent - len(received)}
+    if len(received) >= 2:
+        result["fps"] = (len(received) - 1) / (received[-1] - received[0])
+    if len(latencies) >= 2:
+        quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        result["latency"] = {"p50": quantiles[49], "p95": quantiles[94], "p99": quantiles[98], "max": max(latencies)}
+
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Wait until the labgrid coordinator knows resources matching all given patterns and print all resources as JSON.
+
+This script runs on the LXA TAC. Resource updates are pushed by the coordinator, so the script reacts as soon as the
+expected resources show up.
+
+Usage: labgrid-resources.py COORDINATOR TIMEOUT [PATTERN...]
+
+PATTERN is a regular expression matched against the resource names in the form exporter/group/cls[/name].
+The output is a JSON object with the time until all patterns matched ("elapsed", `null` on timeout) and all
+available resources by name ("resources").
+"""
+
+import asyncio
+import json
+import re
+import sys
+import time
+
+from labgrid.remote.client import start_session
+
+
+def available(session):
+    resources = {}
+    for exporter, groups in session.resources.items():
+        for group_name, group in groups.items():
+            for resource_name, resource in group.items():
+                if not resource.avail:
+                    continue
+                name = f"{exporter}/{group_name}/{resource.cls}"
+                if resource_name != resource.cls:
+                    name += f"/{resource_name}"
+                resources[name] = resource.asdict()
+    return resources
+
+
+def main():
+    coordinator, timeout, *patterns = sys.argv[1:]
+    patterns = [re.compile(p) for p in patterns]
+
+    start = time.monotonic()
+    elapsed = None
+
+    # The coordinator may still be starting up
+    while True:
+        try:
+            session = start_session(coordinator)
+            break
+        except Exception:
+            if time.monotonic() - start > float(timeout):
+                raise
+            time.sleep(1)
+
+    while time.monotonic() - start < float(timeout):
+        resources = available(session)
+        if all(any(p.fullmatch(name) for name in resources) for p in patterns):
+            elapsed = time.monotonic() - start
+            break
+        # Let the session process the updates pushed by the coordinator
+        session.loop.run_until_complete(asyncio.sleep(0.1))
+
+    json.dump({"elapsed": elapsed, "resources": available(session)}, sys.stdout)
+    print()
+    session.loop.run_until_complete(session.stop())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/bin/bash
+#
+# Probe the automounts given as arguments concurrently.
+#
+# This script runs on the LXA TAC.
+# For each automount it prints one JSON object per line (in the order the probes finish) with:
+#  - "share": the path of the automount
+#  - "automount": whether an autofs mount exists for the path
+#  - "readable": whether listing the path returned at least one entry within TIMEOUT seconds
+#  - "options": the mount options of the NFS mount, empty if it is not mounted
+#  - "duration": the time in seconds the probe took
+#
+# Usage: probe-automounts.sh TIMEOUT SHARE...
+
+timeout="$1"
+shift
+
+probe() {
+    local share="$1"
+    local start end automount readable options
+
+    start=$(date +%s.%N)
+
+    automount=false
+    findmnt -n -t autofs "$share" > /dev/null && automount=true
+
+    # Timeout of the automount-units are a generous 30s.
+    # Use a much longer timeout to catch all problems on the DUT.
+    readable=false
+    [ -n "$(timeout "$timeout" ls -1 "$share" 2> /dev/null | head -n 1)" ] && readable=true
+
+    options=$(findmnt -n -t nfs4 -o OPTIONS "$share")
+
+    end=$(date +%s.%N)
+
+    printf '{"share": "%s", "automount": %s, "readable": %s, "options": "%s", "duration": %s}\n' \
+        "$share" "$automount" "$readable" "$options" "$(awk "BEGIN { print $end - $start }")"
+}
+
+for share in "$@"; do
+    probe "$share" &
+done
+wait
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Measure the throughput of a random number generator device and check the quality of its output.
+
+This script runs on the LXA TAC, so the random data does not have to be transferred to the host.
+DEVICE is read in chunks of 4 KiB for DURATION seconds. The first SAMPLE bytes are evaluated statistically:
+
+- chi-square: of the byte histogram against a uniform distribution (255 degrees of freedom)
+- monobit: z-score of the number of one bits against the expected half of all bits
+- entropy: Shannon entropy of the bytes in bits per byte
+
+The result is printed as JSON object.
+
+Usage: rng-bench.py DEVICE DURATION SAMPLE
+"""
+
+import json
+import math
+import sys
+import time
+
+
+def main():
+    device, duration, sample_size = sys.argv[1], float(sys.argv[2]), int(sys.argv[3])
+
+    total = 0
+    sample = bytearray()
+    with open(device, "rb", buffering=0) as f:
+        start = time.monotonic()
+        while (elapsed := time.monotonic() - start) < duration:
+            chunk = f.read(4096)
+            total += len(chunk)
+            if len(sample) < sample_size:
+                sample += chunk[: sample_size - len(sample)]
+
+    n = len(sample)
+    if n == 0:
+        sys.exit(f"No data read from {device} within {duration} s")
+
+    counts = [sample.count(value) for value in range(256)]
+    expected = n / 256
+    ones = sum(count * bin(value).count("1") for value, count in enumerate(counts))
+
+    print(
+        json.dumps(
+            {
+                "bytes": total,
+                "duration": elapsed,
+                "sample": n,
+                "chi-square": sum((count - expected) ** 2 / expected for count in counts),
+                "monobit": (ones - n * 4) / math.sqrt(n * 2),
+                "entropy": -sum(count / n * math.log2(count / n) for count in counts if count),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Sample the health of the LXA TAC at a fixed rate into a ring buffer.
+
+This script runs on the LXA TAC until it is stopped.
+Each sample is one JSON object per line with the time (CLOCK_REALTIME), the CPU utilization since the previous
+sample, the available memory, the SoC temperature and the cumulative eMMC and network counters.
+The network counters include interfaces that were moved into a network namespace (see `helper.NetnsTopology`).
+
+The ring buffer consists of two files: Samples are appended to PREFIX.a. Once it holds SIZE samples, it is moved
+to PREFIX.b (replacing the older samples) and a new PREFIX.a is started.
+So `cat PREFIX.b PREFIX.a` returns between SIZE and 2 * SIZE of the latest samples in order.
+
+Usage: telemetry-sampler.py PREFIX INTERVAL SIZE
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def cpu_times():
+    with open("/proc/stat") as f:
+        times = [int(t) for t in f.readline().split()[1:9]]
+    idle = times[3] + times[4]
+    return sum(times) - idle, sum(times)
+
+
+def meminfo():
+    with open("/proc/meminfo") as f:
+        fields = dict(line.split(":", 1) for line in f)
+    return int(fields["MemAvailable"].split()[0]) * 1024
+
+
+def temperature():
+    with open("/sys/class/thermal/thermal_zone0/temp") as f:
+        return int(f.read()) / 1000
+
+
+def emmc():
+    with open("/proc/diskstats") as f:
+        for line in f:
+            fields = line.split()
+            if fields[2] == "mmcblk1":
+                # Sectors are always 512 bytes in /proc/diskstats
+                return int(fields[5]) * 512, int(fields[9]) * 512
+    return 0, 0
+
+
+def net_dev():
+    """Return the lines of /proc/net/dev of the root network namespace and of all named network namespaces."""
+    with open("/proc/net/dev") as f:
+        lines = f.readlines()[2:]
+
+    try:
+        namespaces = os.listdir("/run/netns")
+    except FileNotFoundError:
+        namespaces = []
+    for namespace in namespaces:
+        p = subprocess.run(
+            ["ip", "netns", "exec", namespace, "cat", "/proc/net/dev"], capture_output=True, text=True, check=False
+        )
+        lines += p.stdout.splitlines()[2:]
+
+    return lines
+
+
+def network():
+    rx = tx = 0
+    for line in net_dev():
+        name, counters = line.split(":", 1)
+        if name.strip() in ("dut", "uplink"):
+            counters = counters.split()
+            rx += int(counters[0])
+            tx += int(counters[8])
+    return rx, tx
+
+
+def main():
+    prefix, interval, size = sys.argv[1], float(sys.argv[2]), int(sys.argv[3])
+
+    busy, total = cpu_times()
+    count = 0
+
+    while True:
+        time.sleep(interval - time.time() % interval)
+
+        new_busy, new_total = cpu_times()
+        emmc_read, emmc_written = emmc()
+        net_rx, net_tx = network()
+        sample = {
+            "time": round(time.time(), 3),
+            "cpu": round((new_busy - busy) / max(new_total - total, 1) * 100, 1),
+            "mem_available": meminfo(),
+            "temperature": temperature(),
+            "emmc_read": emmc_read,
+            "emmc_written": emmc_written,
+            "net_rx": net_rx,
+            "net_tx": net_tx,
+        }
+        busy, total = new_busy, new_total
+
+        with open(f"{prefix}.a", "a") as out:
+            out.write(json.dumps(sample) + "\n")
+        count += 1
+
+        if count >= size:
+            os.replace(f"{prefix}.a", f"{prefix}.b")
+            count = 0
+
+
+if __name__ == "__main__":
+    main()
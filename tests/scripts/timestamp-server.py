@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Reply to each UDP datagram with the current system time (CLOCK_REALTIME) in nanoseconds.
+
+This script runs on the LXA TAC until it is stopped.
+The reply contains the payload of the request followed by a space and the timestamp, so replies can be matched
+to their requests.
+
+Usage: timestamp-server.py PORT
+"""
+
+import socket
+import sys
+import time
+
+
+def main():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("", int(sys.argv[1])))
+
+    while True:
+        data, address = sock.recvfrom(64)
+        sock.sendto(data + b" " + str(time.time_ns()).encode(), address)
+
+
+if __name__ == "__main__":
+    main()
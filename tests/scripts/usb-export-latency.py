@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Log when USB devices are enumerated by the kernel and when matching resources appear at the labgrid coordinator.
+
+This script runs on the LXA TAC until it is stopped.
+It writes one JSON object per line and event to LOG, with the event name ("connect", "enumerated", "disconnected",
+"resource-added" or "resource-removed") and the time of the event in seconds.
+LOG is only created once the kernel log is opened and the session to the coordinator is established, starting with
+a "ready" event. So events can not be missed once LOG exists.
+
+All events are timestamped by the kernel log, so they share one clock:
+Kernel events use the timestamp of their message.
+Changes of the resources are written to the kernel log as marker and use the timestamp of the marker.
+The "connect" event is a marker written by the test right before it connects the USB device:
+
+    echo usb-export-latency: connect > /dev/kmsg
+
+Usage: usb-export-latency.py COORDINATOR PATTERN LOG
+
+PATTERN is a regular expression matched against the resource names in the form exporter/group/cls.
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+
+from labgrid.remote.client import start_session
+
+KERNEL_EVENTS = (
+    ("enumerated", re.compile(r"usb \S+: new \S+ USB device number")),
+    ("disconnected", re.compile(r"usb \S+: USB disconnect")),
+    ("connect", re.compile(r"usb-export-latency: connect$")),
+    ("resource-added", re.compile(r"usb-export-latency: resource-added$")),
+    ("resource-removed", re.compile(r"usb-export-latency: resource-removed$")),
+)
+
+
+def emit(log, event, timestamp):
+    log.write(json.dumps({"event": event, "time": timestamp}) + "\n")
+    log.flush()
+
+
+def kernel_events(kmsg):
+    """Return all new kernel events from /dev/kmsg."""
+    events = []
+    while True:
+        try:
+            record = os.read(kmsg, 8192).decode(errors="replace")
+        except BlockingIOError:
+            return events
+        except BrokenPipeError:
+            # Messages were overwritten before we read them
+            continue
+
+        prefix, _, message = record.partition(";")
+        usec = int(prefix.split(",")[2])
+        for event, pattern in KERNEL_EVENTS:
+            if pattern.search(message):
+                events.append((event, usec / 1e6))
+
+
+def matching_resources(session, pattern):
+    return {
+        f"{exporter}/{group_name}/{resource.cls}"
+        for exporter, groups in session.resources.items()
+        for group_name, group in groups.items()
+        for resource in group.values()
+        if resource.avail and pattern.fullmatch(f"{exporter}/{group_name}/{resource.cls}")
+    }
+
+
+def main():
+    coordinator, pattern, path = sys.argv[1:]
+    pattern = re.compile(pattern)
+
+    kmsg = os.open("/dev/kmsg", os.O_RDONLY | os.O_NONBLOCK)
+    os.lseek(kmsg, 0, os.SEEK_END)
+    marker = os.open("/dev/kmsg", os.O_WRONLY)
+
+    session = start_session(coordinator)
+    known = matching_resources(session, pattern)
+
+    with open(path, "w") as log:
+        emit(log, "ready", None)
+
+        while True:
+            for event, timestamp in kernel_events(kmsg):
+                emit(log, event, timestamp)
+
+            current = matching_resources(session, pattern)
+            if current - known:
+                os.write(marker, b"usb-export-latency: resource-added")
+            if known - current:
+                os.write(marker, b"usb-export-latency: resource-removed")
+            known = current
+
+            # Let the session process the updates pushed by the coordinator
+            session.loop.run_until_complete(asyncio.sleep(0.02))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,14 @@
 import json
 
+import pytest
+
 KILO = 1_000
 MEGA = 1_000 * KILO
 GIGA = 1_000 * MEGA
 
 
-def test_partition_sizes(shell, check):
-    stdout = shell.run_check("lsblk -b --json /dev/mmcblk1")
+def test_partition_sizes(strategy, shell, check):
+    stdout = strategy.fact("lsblk-mmcblk1")
     json_info = json.loads("".join(stdout))
 
     [mmcblk1] = json_info["blockdevices"]
@@ -52,3 +54,133 @@ def test_filesystem_sizes(shell, check):
     [fs_info] = json.loads("".join(stdout))["filesystems"]
     with check:
         assert fs_info["used"] / fs_info["size"] < 0.2
+
+
+# fio arguments of the workloads
+FIO_WORKLOADS = {
+    "seq-read": "--rw=read",
+    "seq-write": "--rw=write",
+    "rand-read": "--rw=randread",
+    "rand-write": "--rw=randwrite",
+    "fsync": "--rw=write --fsync=1",
+}
+
+
+# Size of the data transferred by the dd fallback of the sequential workloads
+DD_SIZE = 64 * 1024 * 1024
+
+
+@pytest.fixture
+def fio(shell):
+    """
+    Returns a function that runs a fio job on the DUT and returns the results of the job.
+    Returns `None` if fio is not installed on the DUT.
+    """
+    _, _, returncode = shell.run("which fio")
+    if returncode != 0:
+        return None
+
+    def _fio(filename: str, args: str, runtime: int = 10) -> dict:
+        try:
+            shell.run_check(
+                f"fio --name=benchmark --filename={filename} --direct=1 --ioengine=psync --size=256M "
+                f"--runtime={runtime} --time_based --output-format=json --output=/tmp/fio.json {args}",
+                timeout=runtime + 120,
+            )
+            stdout = shell.run_check("cat /tmp/fio.json")
+        finally:
+            shell.run("rm -f /tmp/fio.json")
+
+        [job] = json.loads("\n".join(stdout))["jobs"]
+        return job
+
+    return _fio
+
+
+def dd(shell, filename: str, workload: str, block_size: str, prepare: bool) -> float:
+    """
+    Run the sequential `workload` on `filename` with dd and direct I/O and return its duration in seconds.
+    With `prepare` the file is written before it is read.
+    """
+    if workload == "seq-read":
+        if prepare:
+            shell.run_check(f"dd if=/dev/zero of={filename} bs=1M count={DD_SIZE // 2**20}", timeout=120)
+        command = f"dd if={filename} of=/dev/null iflag=direct"
+    else:
+        command = f"dd if=/dev/zero of={filename} oflag=direct conv=fsync"
+
+    count = DD_SIZE // (int(block_size[:-1]) * {"k": 2**10, "M": 2**20}[block_size[-1]])
+    [duration] = shell.run_check(
+        f"start=$(date +%s%N) && {command} bs={block_size} count={count} status=none "
+        "&& echo $(( $(date +%s%N) - start ))",
+        timeout=300,
+    )
+    return int(duration) / 1e9
+
+
+def inactive_rootfs(strategy) -> str:
+    """Return the device of the rootfs slot that is not booted."""
+    rauc_status = json.loads("".join(strategy.fact("rauc-status")))
+    for slot in rauc_status["slots"]:
+        [info] = slot.values()
+        if info["class"] == "rootfs" and info["bootname"] != rauc_status["booted"]:
+            return info["device"]
+    raise ValueError("No inactive rootfs slot found")
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize(
+    "location, workload, block_size",
+    (
+        *(("srv", workload, bs) for workload in ("seq-read", "seq-write") for bs in ("4k", "64k", "1M")),
+        ("srv", "rand-read", "4k"),
+        ("srv", "rand-write", "4k"),
+        ("srv", "fsync", "4k"),
+        # The inactive slot is only read, so the installed system is not touched
+        *(("inactive-slot", "seq-read", bs) for bs in ("4k", "64k", "1M")),
+        ("inactive-slot", "rand-read", "4k"),
+    ),
+)
+def test_emmc_performance(strategy, shell, fio, benchmark, location, workload, block_size):
+    """
+    Benchmark the eMMC with direct I/O on /srv and on the inactive rootfs slot.
+
+    The workloads are run with fio. fio is not part of every image: Without it only the throughput of the
+    sequential workloads is measured with dd and the other workloads are skipped.
+    The results are recorded per image and checked against previous runs on the same place (see
+    `--benchmark-history` and `--benchmark-image`).
+    """
+    filename = "/srv/fio-benchmark" if location == "srv" else inactive_rootfs(strategy)
+
+    if fio is None:
+        if workload not in ("seq-read", "seq-write"):
+            pytest.skip(f"fio is not installed on the DUT, which is required for the {workload} workload")
+
+        try:
+            duration = dd(shell, filename, workload, block_size, prepare=location == "srv")
+        finally:
+            if location == "srv":
+                shell.run(f"rm -f {filename}")
+
+        benchmark.record("dd throughput", DD_SIZE / duration / 1e6, "MB/s")
+        benchmark.check()
+        return
+
+    try:
+        job = fio(filename, f"{FIO_WORKLOADS[workload]} --bs={block_size}")
+    finally:
+        if location == "srv":
+            shell.run(f"rm -f {filename}")
+
+    assert job["error"] == 0
+
+    result = job["read"] if workload in ("seq-read", "rand-read") else job["write"]
+    benchmark.record("throughput", result["bw_bytes"] / 1e6, "MB/s")
+    benchmark.record("iops", result["iops"], "1/s")
+    benchmark.record("latency p99", result["clat_ns"]["percentile"]["99.000000"] / 1e6, "ms", higher_is_better=False)
+    if workload == "fsync":
+        benchmark.record(
+            "fsync latency p99", job["sync"]["lat_ns"]["percentile"]["99.000000"] / 1e6, "ms", higher_is_better=False
+        )
+
+    benchmark.check()
@@ -1,3 +1,4 @@
+import contextlib
 import json
 import time
 
@@ -74,12 +75,14 @@ def test_can_traffic(shell, can_configured):
     shell.run_check("ip l set can0_iobus up")
     shell.run_check("ip l set can1 up")
 
-    dump_file = "/tmp/can-test"
+    # candump is ready as soon as its receiver for can1 is registered.
+    # Devices without receivers are listed as "(can1: no entry)".
+    ready = "grep -qE '^ +can1 +[0-9A-Fa-f]+ ' /proc/net/can/rcvlist_all"
 
-    with helper.SystemdRun(f'bash -c "candump -n1 can1 > {dump_file}"', shell):
+    with helper.SystemdRun("candump -n1 can1", shell, ready=ready) as candump:
         shell.run_check("cansend can0_iobus 01a#11223344AABBCCDD")
-        dump = shell.run_check(f"cat {dump_file}")
-        assert "  can1  01A   [8]  11 22 33 44 AA BB CC DD" in dump
+        assert candump.wait(timeout=5) == 0
+        assert "  can1  01A   [8]  11 22 33 44 AA BB CC DD" in candump.output()
 
 
 @pytest.mark.parametrize("can_interface", ("can0_iobus", "can1"))
@@ -109,3 +112,83 @@ def test_can_berr_reset(shell, can_configured, can_interface):
     assert if_state["linkinfo"]["info_data"]["state"] == "STOPPED"
     assert if_state["linkinfo"]["info_data"]["berr_counter"]["tx"] == 0
     assert if_state["linkinfo"]["info_data"]["berr_counter"]["rx"] == 0
+
+
+def can_info(shell, interface: str) -> dict:
+    """Return the CAN specific link information of `interface`, e.g. bit timing, state and bus error counters."""
+    [if_state] = shell.run_check(f"ip -detail -json link show {interface}")
+    [if_state] = json.loads(if_state)
+    return if_state["linkinfo"]["info_data"]
+
+
+def berr_counters(shell) -> dict[str, int]:
+    """Return the sum of the tx and rx bus error counters of each CAN interface."""
+    counters = {}
+    for interface in ("can0_iobus", "can1"):
+        berr_counter = can_info(shell, interface).get("berr_counter", {})
+        counters[interface] = berr_counter.get("tx", 0) + berr_counter.get("rx", 0)
+    return counters
+
+
+@pytest.mark.slow
+@pytest.mark.lg_feature("eet")
+@pytest.mark.parametrize("load", (10, 50, 90))
+@pytest.mark.parametrize("size", (2, 8))
+def test_can_performance(shell, can_configured, benchmark, size, load):
+    """
+    Benchmark sustained CAN traffic from can0_iobus to can1 at `load` percent of the bus capacity.
+
+    Frames with `size` bytes of incrementing data are generated with cangen for about 10 seconds, while candump
+    logs both interfaces with timestamps.
+    The log is evaluated on the DUT: The latency of each frame is measured from its transmission on can0_iobus to
+    its reception on can1.
+    """
+
+    shell.run_check("ip l set can0_iobus up")
+    shell.run_check("ip l set can1 up")
+
+    bitrate = can_info(shell, "can0_iobus")["bittiming"]["bitrate"]
+    # Bits of a frame with standard ID without bit stuffing, plus the interframe space
+    frame_time = (47 + 8 * size) / bitrate
+    gap = frame_time / (load / 100)
+    count = int(10 / gap)
+
+    script = helper.install_script(shell, "can-latency.py")
+    berr_before = berr_counters(shell)
+
+    # candump is ready as soon as its receivers for both interfaces are registered.
+    ready = " && ".join(
+        f"grep -qE '^ +{interface} +[0-9A-Fa-f]+ ' /proc/net/can/rcvlist_all" for interface in ("can0_iobus", "can1")
+    )
+    try:
+        with helper.SystemdRun(
+            f"sh -c 'candump -t a -x -n {2 * count} can0_iobus can1 > /tmp/candump.log'", shell, ready=ready
+        ) as candump:
+            shell.run_check(f"cangen can0_iobus -g {gap * 1000:.3f} -I 123 -L {size} -D i -n {count}", timeout=60)
+            # candump exits once it logged the transmission and the reception of each frame.
+            # If frames were dropped, it is stopped after the timeout and the dropped frames are evaluated below.
+            with contextlib.suppress(TimeoutError):
+                candump.wait(timeout=5)
+
+        [result] = shell.run_check(f"{script} /tmp/candump.log can0_iobus can1", timeout=60)
+        result = json.loads(result)
+    finally:
+        shell.run("rm -f /tmp/candump.log")
+
+    berr_after = berr_counters(shell)
+
+    assert result["sent"] == count
+    # Throughput and latency can only be calculated from at least two received frames
+    assert result["received"] >= 2, f"only {result['received']} of {count} frames were received"
+    assert "fps" in result and "latency" in result, f"incomplete evaluation of the candump log: {result}"
+
+    benchmark.record("frames", result["fps"], "1/s")
+    benchmark.record("dropped", result["dropped"], "", higher_is_better=False)
+    for percentile in ("p50", "p95", "p99", "max"):
+        benchmark.record(f"latency {percentile}", result["latency"][percentile] * 1000, "ms", higher_is_better=False)
+    for interface in ("can0_iobus", "can1"):
+        benchmark.record(
+            f"berr {interface}", berr_after[interface] - berr_before[interface], "", higher_is_better=False
+        )
+
+    benchmark.check()
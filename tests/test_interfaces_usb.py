@@ -1,22 +1,89 @@
+import statistics
+import threading
 import time
+from contextlib import contextmanager
 
+import helper
 import pytest
+import requests
+
+# Size of the data written to and read from the USB storage by the benchmark
+BENCHMARK_SIZE = 32 * 1024 * 1024
+
+
+def usb_storage_device(env, target, port: int) -> str:
+    """
+    Return the USB storage device connected to the EET output of `port`.
+
+    The devices are configured per port via the `usb_storage_ports` target option, only list devices read from the
+    actual hardware there.
+    Without it only port 1 is tested with the device configured in the `usb_storage` target option.
+    Ports without a configured device are skipped.
+    """
+    try:
+        ports = env.config.get_target_option(target.name, "usb_storage_ports")
+    except KeyError:
+        ports = {1: env.config.get_target_option(target.name, "usb_storage")}
+
+    device = ports.get(port, ports.get(str(port)))
+    if device is None:
+        pytest.skip(f"No USB storage configured for port {port}")
+    return device
+
+
+def check_usb_storage(shell, device: str):
+    """Make sure `device` is a removable USB block device, before raw data is written to it."""
+    [properties] = shell.run_check(f"lsblk -dno TRAN,RM $(readlink -f {device})")
+    assert properties.split() == ["usb", "1"], f"{device} is not removable USB storage: {properties}"
+
+
+def timed_run(shell, command: str, timeout: int = 120) -> float:
+    """Run `command` on the DUT and return its duration in seconds, measured on the DUT."""
+    [duration] = shell.run_check(
+        f"start=$(date +%s%N) && {command} && echo $(( $(date +%s%N) - start ))", timeout=timeout
+    )
+    return int(duration) / 1e9
+
+
+@contextmanager
+def sample_current(address: str, port: int, interval: float = 0.1):
+    """
+    Poll the current of USB host `port` from tacd while the context is active.
+    Yields a dict with the list of sampled "values" and the list of "errors" of failed polls.
+    """
+    samples = {"values": [], "errors": []}
+    done = threading.Event()
+
+    def poll():
+        with requests.Session() as session:
+            while not done.wait(interval):
+                try:
+                    r = session.get(f"http://{address}/v1/usb/host/port{port}/feedback/current", timeout=5)
+                    r.raise_for_status()
+                    samples["values"].append(r.json()["value"])
+                except requests.RequestException as e:
+                    samples["errors"].append(str(e))
+
+    thread = threading.Thread(target=poll)
+    thread.start()
+    try:
+        yield samples
+    finally:
+        done.set()
+        thread.join()
 
 
 @pytest.mark.lg_feature("eet")
 def test_interface_usb_io(eet, env, target, shell):
     """Test USB device by writing a small file onto the device and reading it again"""
-    usb_storage = env.config.get_target_option(target.name, "usb_storage")
+    usb_storage = usb_storage_device(env, target, 1)
+    pattern = helper.Pattern(15 * 1024 * 1024)
 
     # Connect USB-Stick to DUT
     eet.link("USB1_IN -> USB1_OUT")
 
-    # Create tmp file
-    shell.run_check("dd if=/dev/random of=/tmp/test_file bs=1M count=15")
-    [checksum1] = shell.run_check("md5sum /tmp/test_file")
-
-    # Write tmp file onto usb device
-    shell.run_check(f"dd if=/tmp/test_file of={usb_storage} bs=1M count=15")
+    # Write the test pattern onto usb device
+    shell.run_check(f"{pattern.command()} | dd of={usb_storage} bs=1M iflag=fullblock")
 
     # Disconnect and connect the USB stick to make sure all buffers have been flushed.
     eet.link("")
@@ -24,10 +91,53 @@ def test_interface_usb_io(eet, env, target, shell):
     eet.link("USB1_IN -> USB1_OUT")
     time.sleep(5)
 
-    # Read tmp file from usb device
-    shell.run_check(f"dd if={usb_storage} of=/tmp/test_file bs=1M count=15")
+    # Read the data back from usb device and compare it to the test pattern
+    _, _, returncode = shell.run(f"{pattern.command()} | cmp -n {pattern.size} - {usb_storage}")
+    assert returncode == 0, "data read from the USB storage differs from the written data"
+
+
+@pytest.mark.slow
+@pytest.mark.lg_feature("eet")
+@pytest.mark.parametrize("block_size", (4096, 65536, 1024 * 1024))
+@pytest.mark.parametrize("port", (1, 2, 3))
+def test_interface_usb_performance(eet, env, target, strategy, shell, benchmark, record_property, port, block_size):
+    """
+    Benchmark USB mass-storage throughput with direct I/O on each EET-switchable USB port.
+
+    The test pattern is generated into RAM once, so neither generating nor verifying the data slows down the
+    transfers: It is written from RAM to the device, read back into RAM and compared afterward.
+    The current of the port is sampled from tacd during the transfers.
+    """
+    usb_storage = usb_storage_device(env, target, port)
+    pattern = helper.Pattern(BENCHMARK_SIZE)
+    count = BENCHMARK_SIZE // block_size
+
+    eet.link(f"USB{port}_IN -> USB{port}_OUT")
+    shell.run_check(f"timeout 30 sh -c 'until [ -b {usb_storage} ]; do sleep 0.5; done'", timeout=40)
+    check_usb_storage(shell, usb_storage)
+
+    try:
+        shell.run_check(f"{pattern.command()} > /tmp/usb-pattern", timeout=120)
+
+        with sample_current(strategy.network.address, port) as currents:
+            write = timed_run(
+                shell, f"dd if=/tmp/usb-pattern of={usb_storage} bs={block_size} oflag=direct conv=fsync status=none"
+            )
+            read = timed_run(
+                shell, f"dd if={usb_storage} of=/tmp/usb-read bs={block_size} count={count} iflag=direct status=none"
+            )
+
+        _, _, returncode = shell.run("cmp /tmp/usb-pattern /tmp/usb-read")
+        assert returncode == 0, "data read from the USB storage differs from the written data"
+    finally:
+        shell.run("rm -f /tmp/usb-pattern /tmp/usb-read")
 
-    # Compare checksums
-    [checksum2] = shell.run_check("md5sum /tmp/test_file")
+    benchmark.record("write", BENCHMARK_SIZE / write / 1e6, "MB/s")
+    benchmark.record("read", BENCHMARK_SIZE / read / 1e6, "MB/s")
+    if currents["errors"]:
+        record_property("current sampling errors", currents["errors"])
+    if currents["values"]:
+        benchmark.record("current mean", statistics.mean(currents["values"]), "A", higher_is_better=None)
+        benchmark.record("current max", max(currents["values"]), "A", higher_is_better=None)
 
-    assert checksum1 == checksum2, f"checksum are different: {checksum1} != {checksum2}"
+    benchmark.check()
@@ -1,7 +1,10 @@
-import ast
+import json
 import re
+import shlex
+import statistics
 import time
 
+import helper
 import pytest
 from helper import SystemdRun
 
@@ -13,7 +16,7 @@ def local_coordinator(shell):
     the coordinator is used by the labgrid-exporter.
     Afterward make sure the configuration change is undone.
     """
-    with SystemdRun(command="labgrid-coordinator -l localhost:20408", shell=shell):
+    with SystemdRun(command="labgrid-coordinator -l localhost:20408", shell=shell, ready=SystemdRun.port(20408)):
         shell.run_check("echo LABGRID_COORDINATOR_IP=localhost > /etc/labgrid/environment.local")
         shell.run_check("echo LABGRID_COORDINATOR_PORT=20408 >> /etc/labgrid/environment.local")
         shell.run_check("mkdir /etc/systemd/system/labgrid-exporter.service.d/")
@@ -30,8 +33,28 @@ def local_coordinator(shell):
         shell.run_check("systemctl restart labgrid-exporter")
 
 
+def wait_for_resources(shell, record_property, patterns: list[str], timeout: int = 60) -> dict[str, dict]:
+    """
+    Wait until the local coordinator knows resources matching all `patterns` (regular expressions matched
+    against exporter/group/cls) and return all available resources by name.
+    """
+    script = helper.install_script(shell, "labgrid-resources.py")
+    stdout = shell.run_check(
+        f"{script} localhost:20408 {timeout} {' '.join(shlex.quote(p) for p in patterns)}", timeout=timeout + 30
+    )
+    result = json.loads("".join(stdout))
+
+    if result["elapsed"] is None:
+        missing = [p for p in patterns if not any(re.fullmatch(p, name) for name in result["resources"])]
+        pytest.fail(f"Failed to get resources matching {missing}, even after trying for {timeout} s")
+
+    record_property("resources-available-after", result["elapsed"])
+
+    return result["resources"]
+
+
 @pytest.mark.slow
-def test_labgrid_resources_simple(shell, strategy, local_coordinator, check):
+def test_labgrid_resources_simple(shell, strategy, local_coordinator, check, record_property):
     exporter = strategy.target_hostname
     expected_resources = (
         (
@@ -110,14 +133,7 @@ def test_labgrid_resources_simple(shell, strategy, local_coordinator, check):
             ),
         ),
     )
-    for _ in range(60 // 15):
-        resources = set(shell.run_check("LG_COORDINATOR=localhost labgrid-client resources"))
-        if resources.issuperset(set(x[0] for x in expected_resources)):
-            # We have found all resources in expected_resources (and possibly even more).
-            break
-        time.sleep(15)
-    else:
-        pytest.fail("Failed to get resources, even after trying for 1 minute")
+    resources = wait_for_resources(shell, record_property, [re.escape(name) for name, _ in expected_resources])
 
     def get_nested(data, path):
         for key in path:
@@ -127,24 +143,14 @@ def test_labgrid_resources_simple(shell, strategy, local_coordinator, check):
                 return None
         return data
 
-    for expected_resource in expected_resources:
-        if not expected_resource[1]:
-            # No need to get details from the exporter if no tests are given
-            continue
-
-        # get currently running config
-        details = shell.run_check(f"LG_COORDINATOR=localhost labgrid-client -vv resources {expected_resource[0]}")
-        details = "".join(d for d in details if d.startswith("      "))
-        details = ast.literal_eval(details)
-
-        # Perform tests
-        for expected_config in expected_resource[1]:
+    for name, expected_configs in expected_resources:
+        for path, value in expected_configs:
             with check:
-                assert get_nested(details, expected_config[0]) == expected_config[1]
+                assert get_nested(resources[name], path) == value, f"{name}: {'/'.join(path)}"
 
 
 @pytest.mark.slow
-def test_labgrid_resources_usb(shell, eet, strategy, local_coordinator):
+def test_labgrid_resources_usb(shell, eet, strategy, local_coordinator, record_property):
     """
     Test if a USB device connected to one of the usb-ports is exported correctly.
     """
@@ -152,19 +158,7 @@ def test_labgrid_resources_usb(shell, eet, strategy, local_coordinator):
         eet.link("USB1_IN -> USB1_OUT, USB2_IN -> USB2_OUT, USB3_IN -> USB3_OUT")
 
     exporter = strategy.target_hostname
-    resource_re = re.compile(exporter + r"\/lxatac-usb-ports-p.*\/.*")
-    for _ in range(60 // 15):
-        resources = shell.run_check("LG_COORDINATOR=localhost labgrid-client resources")
-        for resource in resources:
-            match = resource_re.match(resource)
-            if match:
-                break
-        else:
-            time.sleep(15)
-            continue
-        break
-    else:
-        pytest.fail("Failed to get resources, even after trying for 1 minute")
+    wait_for_resources(shell, record_property, [re.escape(exporter) + r"/lxatac-usb-ports-p.*/.*"])
 
 
 def test_labgrid_coordinator_disabled(shell):
@@ -208,3 +202,81 @@ def test_labgrid_coordinator_starting(shell):
 
     finally:
         shell.run_check("systemctl --no-pager stop labgrid-coordinator")
+
+
+@pytest.mark.slow
+@pytest.mark.lg_feature("eet")
+def test_labgrid_resources_usb_latency(shell, eet, strategy, local_coordinator, benchmark, artifact, record_property):
+    """
+    Measure how long it takes for a USB device plugged into the TAC to show up as labgrid resource.
+
+    The device on USB1 is connected repeatedly via the EET.
+    For each connect the time until the kernel enumerates the device and until the resource is available at the
+    coordinator are measured on the TAC.
+    The connect is marked in the kernel log right before the EET is switched, so all events are timestamped by the
+    same clock. The connect includes the switching time of the EET.
+    """
+    repetitions = 10
+    exporter = strategy.target_hostname
+    script = helper.install_script(shell, "usb-export-latency.py")
+    log = "/tmp/usb-export-latency.jsonl"
+
+    def events():
+        return [json.loads(line) for line in shell.run_check(f"cat {log}")]
+
+    def wait_for(event, count, timeout=60):
+        start = time.monotonic()
+        while time.monotonic() - start < timeout:
+            if sum(e["event"] == event for e in events()) >= count:
+                return
+            time.sleep(0.5)
+        pytest.fail(f"Event {event} did not occur {count} times within {timeout} s")
+
+    # Make sure the exporter is known to the coordinator before starting the measurement
+    eet.link("")
+    wait_for_resources(shell, record_property, [re.escape(exporter) + r"/.*"])
+
+    pattern = re.escape(exporter) + r"/lxatac-usb-ports-p1/.*"
+    shell.run(f"rm -f {log}")
+    with SystemdRun(
+        shlex.join([script, "localhost:20408", pattern, log]), shell, ready=SystemdRun.file(log), ready_timeout=60
+    ):
+        try:
+            for i in range(repetitions):
+                shell.run_check("echo usb-export-latency: connect > /dev/kmsg")
+                eet.link("USB1_IN -> USB1_OUT")
+                wait_for("resource-added", i + 1)
+
+                eet.link("")
+                wait_for("resource-removed", i + 1)
+        finally:
+            timeline = events()
+            shell.run(f"rm -f {log}")
+
+    with open(artifact("timeline.json"), "w") as f:
+        json.dump(timeline, f, indent=2)
+
+    connects = [e["time"] for e in timeline if e["event"] == "connect"]
+    assert len(connects) == repetitions, f"Only {len(connects)} of {repetitions} connects were logged"
+
+    stages = {"connect to enumeration": [], "enumeration to resource": [], "connect to resource": []}
+    for connect in connects:
+        enumerated = min(
+            (e["time"] for e in timeline if e["event"] == "enumerated" and e["time"] >= connect), default=None
+        )
+        added = min(
+            (e["time"] for e in timeline if e["event"] == "resource-added" and e["time"] >= connect), default=None
+        )
+        assert enumerated is not None, f"No enumeration logged after the connect at {connect}"
+        assert added is not None, f"No resource added after the connect at {connect}"
+        stages["connect to enumeration"].append(enumerated - connect)
+        stages["enumeration to resource"].append(added - enumerated)
+        stages["connect to resource"].append(added - connect)
+
+    for stage, latencies in stages.items():
+        p50, p95 = (statistics.quantiles(latencies, n=100, method="inclusive")[p - 1] for p in (50, 95))
+        benchmark.record(f"{stage} p50", p50, "s", higher_is_better=False)
+        benchmark.record(f"{stage} p95", p95, "s", higher_is_better=False)
+        benchmark.record(f"{stage} max", max(latencies), "s", higher_is_better=None)
+
+    benchmark.check()
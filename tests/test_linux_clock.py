@@ -1,36 +1,74 @@
-from datetime import datetime
-from time import monotonic
+import math
+import socket
+import statistics
+from time import monotonic, sleep
 
+import helper
 import pytest
 
 
-def test_clock_system(shell):
+def measure_drift(address: str, port: int, duration: float = 10.0, interval: float = 0.01) -> tuple[float, float, int]:
     """
-    This test checks the system clock frequency by running `date` with `sleep`
-    and measures the elapsed time against the host time.
+    Measure the drift of the DUT's system clock against the host's monotonic clock.
+
+    Timestamps are requested from the timestamp server on the DUT every `interval` seconds for `duration` seconds.
+    Each DUT timestamp is paired with the midpoint of the round trip on the host.
+    Pairs with a round trip time above the median are dropped, since their midpoint is less accurate.
+    The drift is the slope of a linear regression of the DUT time over the host time.
+
+    Returns the drift in ppm, the half-width of its 95 % confidence interval in ppm and the number of pairs used.
     """
+    pairs = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.connect((address, port))
+        sock.settimeout(1.0)
+
+        start = monotonic()
+        sequence = 0
+        while monotonic() - start < duration:
+            sequence += 1
+            sent = monotonic()
+            sock.send(str(sequence).encode())
+            try:
+                while True:
+                    reply = sock.recv(64).split()
+                    if int(reply[0]) == sequence:
+                        break
+            except TimeoutError:
+                continue
+            received = monotonic()
+            pairs.append((received - sent, (sent + received) / 2 - start, int(reply[1]) / 1e9))
+
+            sleep(max(0.0, interval - (monotonic() - sent)))
 
-    def run_cmd(sleep):
-        host_start_time = monotonic()
+    assert len(pairs) > 10, "Too few replies from the timestamp server"
 
-        date_fmt = "'%Y-%m-%d %H:%M:%S.%N'"
-        stdout = shell.run_check(
-            f"date -u +{date_fmt}; sleep {sleep}; date -u +{date_fmt}", timeout=float(sleep) + 5.0
-        )
+    median_rtt = statistics.median(rtt for rtt, _, _ in pairs)
+    x = [host for rtt, host, _ in pairs if rtt <= median_rtt]
+    y = [dut - pairs[0][2] for rtt, _, dut in pairs if rtt <= median_rtt]
 
-        # `date` on the DUT supports %N (nanoseconds), `datetime` can only parse %f (microseconds).
-        # `date` adds zero-padding to all fields, so we can simply drop the last three digits of %N.
-        date0 = datetime.strptime(stdout[0][:-3], "%Y-%m-%d %H:%M:%S.%f")
-        date1 = datetime.strptime(stdout[1][:-3], "%Y-%m-%d %H:%M:%S.%f")
+    slope, intercept = statistics.linear_regression(x, y)
+    residuals = [yi - (slope * xi + intercept) for xi, yi in zip(x, y, strict=True)]
+    x_mean = statistics.mean(x)
+    stderr = math.sqrt(sum(r**2 for r in residuals) / (len(x) - 2) / sum((xi - x_mean) ** 2 for xi in x))
 
-        assert date0 <= date1
+    return (slope - 1) * 1e6, 1.96 * stderr * 1e6, len(x)
 
-        return (monotonic() - host_start_time), (date1 - date0).total_seconds()
 
-    # get connection offset
-    connection_offset, _ = run_cmd(0)
+def test_clock_system(strategy, shell, record_property):
+    """
+    This test checks the system clock frequency by requesting many timestamps from the DUT over UDP and
+    fitting the DUT time against the host time.
+    """
+    port = 5153
+    script = helper.install_script(shell, "timestamp-server.py")
+
+    with helper.SystemdRun(f"{script} {port}", shell, ready=helper.SystemdRun.port(port)):
+        drift, confidence, samples = measure_drift(strategy.network.address, port)
 
-    # run test
-    ref_offset, meas_offset = run_cmd(30)
+    record_property("clock-drift-ppm", drift)
+    record_property("clock-drift-confidence-ppm", confidence)
+    record_property("clock-drift-samples", samples)
 
-    assert meas_offset / (ref_offset - connection_offset) == pytest.approx(1.0, abs=1e-2)
+    assert confidence < 50, "Measurement is too noisy"
+    assert drift == pytest.approx(0, abs=1000)
@@ -21,20 +21,20 @@ def test_linux_i2c_bus_1_eeprom(shell):
     assert magic == "vCiN/g=="
 
 
-def test_linux_i2c_bus_1_pmic(shell):
+def test_linux_i2c_bus_1_pmic(strategy, shell):
     """
     Test if a driver for the PMIC on i2cbus-1 has been loaded.
     """
-    [name] = shell.run_check("cat /sys/bus/i2c/devices/1-0033/name")
+    [name] = strategy.fact("i2c-1-0033-name")
     assert name == "stpmic1"
 
 
-def test_linux_i2c_bus_2_usbhub(shell):
+def test_linux_i2c_bus_2_usbhub(strategy, shell):
     """
     Test if a driver for the USB hub on i2cbus-2 has been loaded.
     """
 
-    [name] = shell.run_check("cat /sys/bus/i2c/devices/2-002c/name")
+    [name] = strategy.fact("i2c-2-002c-name")
     assert name == "usb2514b"
 
 
@@ -50,14 +50,14 @@ def test_linux_spi_0_adc(shell):
     assert int(digits) > 0
 
 
-def test_linux_spi_1_lcd(shell):
+def test_linux_spi_1_lcd(strategy, shell):
     """
     Test if the framebuffer for the LCD on spi-1 exists.
     """
 
     # This is not a test of the SPI device itself, since we do not get any feedback from the display.
     # But this way, we at least know that the correct drm device has been probed.
-    [name] = shell.run_check("cat /sys/bus/spi/devices/spi1.0/graphics/fb0/name")
+    [name] = strategy.fact("spi1.0-fb0-name")
     assert name == "panel-mipi-dbid"
 
 
@@ -1,5 +1,23 @@
 """Run linux random number generator checks."""
 
+import json
+
+import helper
+import pytest
+
+# Default limits of the RNG benchmark. They can be overridden per device via the `rng-thresholds` target option,
+# e.g. `rng-thresholds: {hwrng: {throughput: 50000}}`.
+RNG_THRESHOLDS = {
+    # Minimum throughput in bytes/s
+    "throughput": 1_000,
+    # Range of the chi-square statistic of the byte histogram (255 degrees of freedom, p = 0.001 on each side)
+    "chi-square": (190, 330),
+    # Maximum absolute z-score of the number of one bits
+    "monobit": 5,
+    # Minimum Shannon entropy in bits per byte
+    "entropy": 7.99,
+}
+
 
 def test_dev_random(shell):
     """Test if we can read /dev/random and not get timeout"""
@@ -19,3 +37,36 @@ def test_dev_hwrng(shell):
 def test_hwrng_task(shell):
     """Test that hwrng kernel task is running"""
     shell.run_check("pgrep -P 2 -x hwrng")
+
+
+@pytest.mark.parametrize("device", ("hwrng", "random", "urandom"))
+def test_rng_performance(env, target, shell, record_property, check, device):
+    """
+    Measure the sustained throughput of a random number generator over 10 seconds and check the quality of its
+    output statistically.
+    The data is read and evaluated on the DUT, only the results are transferred.
+    """
+    try:
+        overrides = env.config.get_target_option(target.name, "rng-thresholds").get(device, {})
+    except KeyError:
+        overrides = {}
+    thresholds = RNG_THRESHOLDS | overrides
+
+    script = helper.install_script(shell, "rng-bench.py")
+    [result] = shell.run_check(f"{script} /dev/{device} 10 1000000", timeout=60)
+    result = json.loads(result)
+
+    throughput = result["bytes"] / result["duration"]
+    record_property("throughput [B/s]", throughput)
+    for statistic in ("chi-square", "monobit", "entropy"):
+        record_property(statistic, result[statistic])
+
+    with check:
+        assert throughput >= thresholds["throughput"]
+    with check:
+        low, high = thresholds["chi-square"]
+        assert low <= result["chi-square"] <= high
+    with check:
+        assert abs(result["monobit"]) <= thresholds["monobit"]
+    with check:
+        assert result["entropy"] >= thresholds["entropy"]
@@ -1,34 +1,172 @@
+import json
+import statistics
+import threading
+import time
+
+import helper
 import pytest
+import requests
 import yaml
 
+# Maximum SoC temperature in °C allowed under sustained load.
+# The STM32MP157 is specified up to 125 °C junction temperature, keep a generous margin.
+MAX_TEMPERATURE = 90
+
 
-def run_stressor(shell, args):
-    shell.run_check(f"stress-ng --yaml /tmp/stress-ng.yaml --timeout 10s --metrics {args}")
+def run_stressor(shell, args, timeout=10):
+    """Run stress-ng with `args` for `timeout` seconds and return its metrics."""
+    shell.run_check(
+        f"stress-ng --yaml /tmp/stress-ng.yaml --timeout {timeout}s --metrics {args}", timeout=timeout + 60
+    )
     data = shell.run_check("cat /tmp/stress-ng.yaml")
     data = yaml.load("\n".join(data), Loader=yaml.SafeLoader)
     return data
 
 
-# run multiple similar tests
-@pytest.mark.parametrize(
-    "stressor",
-    (
-        "matrix",
-        "zero",
-        "yield",
-        "switch",
-        "shm",
-        "remap",
-        "qsort",
-        "bsearch",
-        "atomic",
-    ),
+STRESSORS = (
+    "matrix",
+    "zero",
+    "yield",
+    "switch",
+    "shm",
+    "remap",
+    "qsort",
+    "bsearch",
+    "atomic",
 )
-def test_stress(shell, stressor, record_property):
-    args = "--shm-bytes 1M" if stressor == "shm" else ""
 
-    data = run_stressor(shell, f"--{stressor} 0 {args}")
-    metrics = data["metrics"][0]
-    assert metrics["stressor"] == stressor
 
-    record_property("bogo-ops-per-second-usr-sys-time", metrics["bogo-ops-per-second-usr-sys-time"])
+@pytest.fixture(scope="module")
+def stress_sweep(strategy):
+    """
+    Run all `STRESSORS` one after another in a single stress-ng session, once for each instance count from one to the
+    number of CPU cores.
+    Returns the metrics of each stressor by instance count.
+    """
+    strategy.transition("shell")
+    shell = strategy.shell
+
+    [cores] = shell.run_check("nproc")
+    instances = range(1, int(cores) + 1)
+
+    results = {}
+    for n in instances:
+        # stress-ng fails if any of the stressors fails. The missing metrics are reported by the test of the stressor.
+        shell.run(
+            f"stress-ng --seq {n} --with {','.join(STRESSORS)} --shm-bytes 1M --timeout 10s --metrics "
+            "--yaml /tmp/stress-ng.yaml",
+            timeout=len(STRESSORS) * 10 + 60,
+        )
+        data, _, returncode = shell.run("cat /tmp/stress-ng.yaml && rm /tmp/stress-ng.yaml")
+        if returncode != 0:
+            continue
+
+        data = yaml.load("\n".join(data), Loader=yaml.SafeLoader)
+        for metrics in data.get("metrics", []):
+            results.setdefault(metrics["stressor"], {})[n] = metrics
+
+    return instances, results
+
+
+@pytest.mark.parametrize("stressor", STRESSORS)
+def test_stress(stress_sweep, shell, stressor, record_property):
+    """
+    Check the results of a stressor from the sweep and report how the stressor scales across the CPU cores.
+    The scaling efficiency is the throughput with n instances relative to n times the throughput of one instance.
+    """
+    instances, results = stress_sweep
+
+    assert stressor in results, f"stress-ng did not report metrics for {stressor}"
+    metrics = results[stressor]
+    assert set(metrics) == set(instances), f"stress-ng did not report metrics for all instance counts: {set(metrics)}"
+
+    record_property("bogo-ops-per-second-usr-sys-time", metrics[instances[-1]]["bogo-ops-per-second-usr-sys-time"])
+
+    single = metrics[1]["bogo-ops-per-second-real-time"]
+    for n in instances:
+        real_time = metrics[n]["bogo-ops-per-second-real-time"]
+        record_property(f"bogo-ops-per-second-real-time-{n}", real_time)
+        record_property(f"scaling-efficiency-{n}", real_time / (n * single) if single else 0)
+
+    assert single > 0, f"{stressor} did not make any progress"
+
+
+def steady_state_time(curve: list[tuple[float, float]], tolerance: float = 1.0) -> float:
+    """
+    Return the time after which all values of `curve` (pairs of time and value) stay within `tolerance` of the mean
+    of the last fifth of the values.
+    """
+    final = statistics.mean(v for _, v in curve[-max(1, len(curve) // 5) :])
+    for i, (t, _) in enumerate(curve):
+        if all(abs(v - final) <= tolerance for _, v in curve[i:]):
+            return t
+    return curve[-1][0]
+
+
+@pytest.mark.slow
+def test_stress_thermal(strategy, shell, benchmark, artifact, record_property):
+    """
+    Run the matrix stressor on all cores for several back-to-back intervals and check how the TAC heats up.
+
+    The SoC temperature and the CPU frequency are sampled on the DUT and the temperature is additionally polled from
+    tacd concurrently. The curves are stored as artifact.
+    Derived metrics are the peak temperature, the time until the temperature reaches a steady state and the drop
+    of the bogo-ops between the first and the last interval (e.g. due to throttling).
+    """
+    intervals = 10
+    interval_duration = 30
+
+    tacd_curve = []
+    stop = threading.Event()
+
+    def poll_tacd(start):
+        with requests.Session() as session:
+            while not stop.wait(1):
+                try:
+                    r = session.get(f"http://{strategy.network.address}/v1/tac/temperatures/soc", timeout=5)
+                    tacd_curve.append((time.monotonic() - start, r.json()["value"]))
+                except requests.RequestException:
+                    pass
+
+    bogo_ops = []
+    with helper.ThermalSampler(shell) as thermal:
+        [dut_start] = shell.run_check("date +%s.%N")
+        poller = threading.Thread(target=poll_tacd, args=(time.monotonic(),))
+        poller.start()
+        try:
+            for _ in range(intervals):
+                data = run_stressor(shell, "--matrix 0", timeout=interval_duration)
+                bogo_ops.append(data["metrics"][0]["bogo-ops-per-second-real-time"])
+        finally:
+            stop.set()
+            poller.join()
+
+    start = float(dut_start)
+    temperature_curve = [(t - start, temp) for t, temp, _ in thermal.samples if t >= start]
+    frequency_curve = [(t - start, freq) for t, _, freq in thermal.samples if t >= start]
+
+    with open(artifact("curves.json"), "w") as f:
+        json.dump(
+            {
+                "temperature": temperature_curve,
+                "frequency": frequency_curve,
+                "tacd-temperature": tacd_curve,
+                "bogo-ops-per-second-real-time": bogo_ops,
+            },
+            f,
+            indent=2,
+        )
+
+    peak = max(v for _, v in temperature_curve)
+    benchmark.record("peak temperature", peak, "°C", higher_is_better=False)
+    if tacd_curve:
+        benchmark.record("peak temperature tacd", max(v for _, v in tacd_curve), "°C", higher_is_better=None)
+    benchmark.record("time to steady state", steady_state_time(temperature_curve), "s", higher_is_better=None)
+    # The frequency is 0 if cpufreq is not available
+    if any(v for _, v in frequency_curve):
+        benchmark.record("min cpu frequency", min(v for _, v in frequency_curve), "MHz")
+    assert bogo_ops[0] > 0, "the matrix stressor did not make any progress in the first interval"
+    benchmark.record("bogo-ops drop", (bogo_ops[0] - bogo_ops[-1]) / bogo_ops[0] * 100, "%", higher_is_better=False)
+
+    assert peak <= MAX_TEMPERATURE, f"SoC temperature exceeded {MAX_TEMPERATURE} °C"
+    benchmark.check()
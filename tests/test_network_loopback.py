@@ -0,0 +1,185 @@
+import json
+from time import sleep
+
+import helper
+import pytest
+
+# To test the TAC's network, we use ourselves as an endpoint by using an Ethmux.
+# For that, we create a new namespace where we put the DUT port in and which
+# will communicate with the uplink port through the Ethmux.
+#
+# This way we can check that both network ports are working as expected.
+# And it also allows us to test local services like TFTP and HTTP server against
+# ourselves without the need for an external test setup on the labgrid exporter.
+TOPOLOGY = helper.NetnsTopology(
+    namespace="dut-namespace",
+    stop_services=("tacd", "NetworkManager"),
+    # The bridge is recreated by NetworkManager
+    delete_links=("tac-bridge",),
+    addresses=(("uplink", "10.11.12.2/24"),),
+    namespace_addresses=(("dut", "10.11.12.1/24"),),
+)
+
+
+@pytest.fixture(scope="module")
+def network_topology(strategy):
+    """
+    Apply the topology once for all tests in this module and restore the default network configuration afterward.
+    """
+    strategy.transition("shell")
+    strategy.ethmux.set(False)  # Connect Upstream Ethernet-port to DUT Ethernet-port
+    TOPOLOGY.apply(strategy.shell)
+    yield TOPOLOGY
+    strategy.transition("shell")
+    # The topology is gone if the TAC was rebooted in between
+    if TOPOLOGY.applied(strategy.shell):
+        TOPOLOGY.teardown(strategy.shell)
+    strategy.ethmux.set(True)  # Reconnect Upstream Ethernet-port to Lab Network
+    strategy.wait_online()
+
+
+@pytest.fixture(scope="function")
+def prepare_network(network_topology, strategy, shell):
+    """
+    Make sure the topology is still in place before each test and reapply it otherwise.
+    """
+    if not network_topology.applied(shell):
+        strategy.ethmux.set(False)
+        network_topology.apply(shell)
+
+
+@pytest.mark.lg_feature("ethmux")
+def test_network_tftp(prepare_network, shell, log_duration):
+    """Test tftp functionality"""
+
+    try:
+        # Create test file in tftp directory and grant access to it
+        shell.run_check("touch /srv/tftp/test_file && chmod o+w /srv/tftp/test_file")
+
+        # Create test file that will be uploaded
+        shell.run_check("dd if=/dev/random of=./test_file bs=1M count=15")
+
+        # Generate checksum
+        checksum1 = shell.run_check("md5sum ./test_file")
+        assert len(checksum1) > 0
+
+        # Upload file to tftp server
+        with log_duration("tftp put"):
+            shell.run_check("ip netns exec dut-namespace tftp -p -r ./test_file 10.11.12.2", timeout=35)
+
+        # Download file from tftp server
+        with log_duration("tftp get"):
+            shell.run_check("ip netns exec dut-namespace tftp -g -r test_file 10.11.12.2", timeout=35)
+
+        # Generate checksum
+        checksum2 = shell.run_check("md5sum ./test_file")
+        assert len(checksum2) > 0
+
+        # Compare checksums
+        assert checksum1 == checksum2, f"checksum are different: {checksum1} != {checksum2}"
+
+    finally:
+        # Clean up
+        shell.run("rm /srv/tftp/test_file ./test_file")
+
+
+@pytest.mark.slow
+@pytest.mark.lg_feature("ethmux")
+@pytest.mark.parametrize(
+    "bandwidth, expected",
+    ((10, pytest.approx(9, rel=0.1)), (100, pytest.approx(90, rel=0.1)), (1000, pytest.approx(350, rel=0.1))),
+)
+def test_network_performance(prepare_network, shell, record_property, bandwidth, expected):
+    """Test network performance via iperf3"""
+
+    try:
+        # Set bandwidth on both interfaces
+        shell.run_check(f"ethtool -s uplink speed {bandwidth}")
+        shell.run_check(f"ip netns exec dut-namespace ethtool -s dut speed {bandwidth}")
+
+        # Await setup time
+        sleep(5)
+
+        # Start iperf server in network namespace
+        port = 5151
+        with helper.SystemdRun(
+            f"ip netns exec dut-namespace iperf3 -s -1 -p {port}",
+            shell,
+            ready=helper.SystemdRun.port(port, netns="dut-namespace"),
+        ):
+            # Run iperf client client in default network namespace
+            stdout = shell.run_check(f"iperf3 -J -c 10.11.12.1 -p {port}")
+
+            results = json.loads("".join(stdout), strict=False)
+
+            mbps_received = results["end"]["sum_received"]["bits_per_second"] / 1e6
+            record_property(f"actual-bandwidth-{bandwidth}", mbps_received)
+            assert mbps_received == expected
+
+    finally:
+        # Reset bandwidth configuration
+        shell.run("ethtool -s uplink speed 1000")
+        shell.run("ip netns exec dut-namespace ethtool -s dut speed 1000")
+
+
+@pytest.mark.slow
+@pytest.mark.lg_feature("ethmux")
+@pytest.mark.parametrize("streams", (1, 4))
+@pytest.mark.parametrize("direction", ("forward", "reverse", "bidir"))
+@pytest.mark.parametrize("protocol", ("tcp", "udp"))
+def test_network_iperf3(prepare_network, shell, benchmark, protocol, direction, streams):
+    """
+    Benchmark the network throughput via iperf3 at full link speed.
+
+    The server runs in the network namespace.
+    `forward` sends data from the client to the server, `reverse` from the server to the client and
+    `bidir` in both directions at the same time.
+    The results are checked against previous runs on the same place (see `--benchmark-history`).
+    """
+    port = 5152
+    args = {
+        "forward": "",
+        "reverse": "-R",
+        "bidir": "--bidir",
+    }[direction]
+    if protocol == "udp":
+        # Offer a bit more than the link can carry in total, so that the loss becomes visible
+        args += f" -u -b {1200 // streams}M"
+
+    # Sample the SoC temperature on the DUT, since tacd is not running during these tests
+    with (
+        helper.ThermalSampler(shell) as thermal,
+        helper.SystemdRun(
+            f"ip netns exec dut-namespace iperf3 -s -1 -p {port}",
+            shell,
+            ready=helper.SystemdRun.port(port, netns="dut-namespace"),
+        ),
+    ):
+        stdout = shell.run_check(f"iperf3 -J -c 10.11.12.1 -p {port} -t 10 -P {streams} {args}", timeout=60)
+
+    end = json.loads("".join(stdout), strict=False)["end"]
+
+    if protocol == "tcp":
+        benchmark.record("throughput", end["sum_received"]["bits_per_second"] / 1e6, "Mbit/s")
+        benchmark.record("retransmits", end["sum_sent"]["retransmits"], "", higher_is_better=None)
+        if direction == "bidir":
+            benchmark.record(
+                "throughput reverse", end["sum_received_bidir_reverse"]["bits_per_second"] / 1e6, "Mbit/s"
+            )
+    else:
+        benchmark.record("throughput", end["sum"]["bits_per_second"] / 1e6, "Mbit/s")
+        benchmark.record("jitter", end["sum"]["jitter_ms"], "ms", higher_is_better=False)
+        benchmark.record("loss", end["sum"]["lost_percent"], "%", higher_is_better=False)
+        if direction == "bidir":
+            benchmark.record("throughput reverse", end["sum_bidir_reverse"]["bits_per_second"] / 1e6, "Mbit/s")
+            benchmark.record("loss reverse", end["sum_bidir_reverse"]["lost_percent"], "%", higher_is_better=False)
+
+    # Client and server both run on the DUT, so both values are the CPU utilisation of the DUT.
+    cpu = end["cpu_utilization_percent"]
+    benchmark.record("cpu client", cpu["host_total"], "%", higher_is_better=None)
+    benchmark.record("cpu server", cpu["remote_total"], "%", higher_is_better=None)
+
+    if thermal.temperatures:
+        benchmark.record("soc temperature max", max(thermal.temperatures), "°C", higher_is_better=None)
+
+    benchmark.check()
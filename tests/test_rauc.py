@@ -1,4 +1,6 @@
 import json
+import os
+import re
 
 import pytest
 
@@ -18,6 +20,105 @@ is already a dependency of `set_bootstate_in_bootloader`.
 #  and write a test for that.
 
 
+def bundle_info(shell, bundle):
+    """Returns the output of `rauc info` for `bundle`."""
+    # The diversion via the tmp-file allows us to ignore any output on stderr that rauc may output.
+    shell.run_check(f"rauc info {bundle} --output-format=json > /tmp/rauc.json")
+    return json.loads("\n".join(shell.run_check("cat /tmp/rauc.json")))
+
+
+def slot_holds_bundle(shell, bundle, bootname):
+    """
+    Check if the rootfs slot with the given `bootname` has been installed from `bundle`.
+
+    The manifest hash of the bundle and the checksum of its rootfs image are compared to the values
+    rauc recorded in the slot status during the installation.
+    """
+    info = bundle_info(shell, bundle)
+    [rootfs_image] = (image["rootfs"] for image in info["images"] if "rootfs" in image)
+
+    stdout = shell.run_check("rauc status --detailed --output-format=json", timeout=60)
+    rauc_status = json.loads("".join(stdout))
+
+    for slot in rauc_status["slots"]:
+        [slot] = slot.values()
+        if slot.get("class") != "rootfs" or slot.get("bootname") != bootname:
+            continue
+
+        slot_status = slot.get("slot_status", {})
+        return (
+            slot_status.get("bundle", {}).get("hash") == info["hash"]
+            and slot_status.get("checksum", {}).get("sha256") == rootfs_image["checksum"]
+        )
+
+    return False
+
+
+def rauc_install_with_progress(shell, bundle, timeout=600):
+    """
+    Install `bundle` with `rauc install --progress` and timestamp the progress events as they are
+    printed.
+
+    The events are timestamped on the DUT and collected in a file, so the command runs through the regular
+    `shell.run()` and the timestamps do not depend on the latency of the console.
+
+    Returns a list of (seconds since start, percentage, message) tuples.
+    """
+    log = "/tmp/rauc-progress.log"
+    stamp = 'while IFS= read -r line; do echo "$(date +%s.%N) $line"; done'
+
+    try:
+        shell.run_check(
+            f"date +%s.%N > {log}; {{ rauc install --progress {bundle} 2>&1; echo RAUC-EXIT $?; }} | {stamp} >> {log}",
+            timeout=timeout,
+        )
+        start, *lines = shell.run_check(f"cat {log}")
+    finally:
+        shell.run(f"rm -f {log}")
+
+    events = []
+    returncode = None
+    for line in lines:
+        timestamp, _, text = line.partition(" ")
+        if match := re.search(r"(\d+)% (.+)", text):
+            events.append((float(timestamp) - float(start), int(match.group(1)), match.group(2).strip()))
+        elif match := re.fullmatch(r"RAUC-EXIT (\d+)", text.strip()):
+            returncode = int(match.group(1))
+
+    assert returncode == 0, f"rauc install failed: {lines[-5:]}"
+
+    return events
+
+
+def install_phases(events, sizes):
+    """
+    Turn the progress events of a rauc installation into phases.
+
+    Each rauc step is reported once when it starts and once it is done (with the same message and " done.").
+    For steps copying images, `sizes` maps the slot class to the size of the image in bytes to calculate
+    the effective throughput.
+
+    Returns a dict mapping each step to its duration and (if known) throughput in MB/s.
+    """
+    started = {}
+    phases = {}
+    for timestamp, _, message in events:
+        if match := re.fullmatch(r"(.+) (done|failed)\.", message):
+            step = match.group(1)
+            if step not in started:
+                continue
+            duration = timestamp - started.pop(step)
+            phases[step] = {"duration": duration}
+
+            # e.g. "Copying image to rootfs.1"
+            if (copy := re.fullmatch(r"Copying image to (\w+)\.\d+", step)) and copy.group(1) in sizes:
+                phases[step]["mbps"] = sizes[copy.group(1)] / duration / 1e6 if duration > 0 else None
+        else:
+            started[message] = timestamp
+
+    return phases
+
+
 def test_rauc_version(shell):
     """
     Test basic availability working of rauc binary by obtaining version
@@ -45,10 +146,7 @@ def test_rauc_info_json(shell, rauc_bundle, check):
     shell.run_check("rauc-enable-cert devel.cert.pem")
 
     # Let rauc read the info for the rauc bundle.
-    # The diversion via the tmp-file allows us to ignore any output on stderr that rauc may output.
-    shell.run_check(f"rauc info {rauc_bundle()} --output-format=json > /tmp/rauc.json")
-    result = shell.run_check("cat /tmp/rauc.json")
-    result = json.loads("\n".join(result))
+    result = bundle_info(shell, rauc_bundle())
 
     # Check if the bundle contains the metadata that we expect.
     with check:
@@ -65,9 +163,25 @@ def test_rauc_info_json(shell, rauc_bundle, check):
 
 @pytest.mark.slow
 @pytest.mark.dependency()
-def test_rauc_install(strategy, booted_slot, set_bootstate_in_bootloader, rauc_bundle, log_duration):
+def test_rauc_install(
+    request,
+    env,
+    strategy,
+    booted_slot,
+    set_bootstate_in_bootloader,
+    rauc_bundle,
+    log_duration,
+    record_property,
+    artifact,
+):
     """
     Test if a rauc install from slot0 into slot1 works.
+
+    The progress of the installation is recorded as timeline.
+    The duration of each step and the throughput of the image copies are recorded as properties.
+
+    With `--rauc-skip-installed` the installation is skipped if slot1 already holds the bundle
+    (e.g. from a previous test run). slot1 is then only activated.
     """
 
     # Make sure we are in slot 0
@@ -80,10 +194,35 @@ def test_rauc_install(strategy, booted_slot, set_bootstate_in_bootloader, rauc_b
     # So we need to enable it first.
     strategy.shell.run_check("rauc-enable-cert devel.cert.pem")
 
-    # Actual installation - may take a few minutes.
-    # Thus, let's use a large timeout.
-    with log_duration("rauc install duration"):
-        strategy.shell.run_check(f"rauc install {rauc_bundle()}", timeout=600)
+    bundle = rauc_bundle()
+    if request.config.getoption("rauc_skip_installed") and slot_holds_bundle(strategy.shell, bundle, "system1"):
+        # Mark slot1 active (and good) like the installation would have.
+        record_property("rauc install skipped", True)
+        strategy.shell.run_check("rauc status mark-active other")
+    else:
+        sizes = {}
+        for image in bundle_info(strategy.shell, bundle)["images"]:
+            for slot_class, details in image.items():
+                sizes[slot_class] = details["size"]
+
+        # Actual installation - may take a few minutes.
+        # Thus, let's use a large timeout.
+        with log_duration("rauc install duration"):
+            events = rauc_install_with_progress(strategy.shell, bundle, timeout=600)
+
+        phases = install_phases(events, sizes)
+        for step, phase in phases.items():
+            record_property(f"rauc install {step} duration", phase["duration"])
+            if phase.get("mbps"):
+                record_property(f"rauc install {step} MB/s", phase["mbps"])
+
+        # Effective throughput of the whole streaming installation
+        bundle_size = os.path.getsize(env.config.get_image_path("rauc_bundle"))
+        if "Installing" in phases:
+            record_property("rauc install MB/s", bundle_size / phases["Installing"]["duration"] / 1e6)
+
+        with open(artifact("timeline.json"), "w") as f:
+            json.dump({"bundle_size": bundle_size, "events": events, "phases": phases}, f, indent=2)
 
     # Power cycle and reboot into the new system.
     strategy.transition("off")
@@ -1,9 +1,13 @@
 import json
+import statistics
 import time
 
+import helper
 import pytest
 import requests
 
+import httpbench
+
 
 def test_tacd_http_temperature(strategy, shell):
     """Test tacd temperature endpoint."""
@@ -384,3 +388,76 @@ def test_tacd_iobus_power_switchable(strategy, shell, eet, record_property, chec
     assert r.status_code == 200
     record_property("Off -> Voltage", r.json()["value"])
     assert -0.5 < r.json()["value"] < 0.5
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("clients", (1, 4, 16))
+def test_tacd_http_load(strategy, shell, benchmark, artifact, clients):
+    """
+    Test the web server under load from multiple concurrent clients.
+
+    The clients send a mix of tacd REST API requests and static downloads from `/srv/`, see `httpbench.py`.
+    The SoC temperature is sampled on the DUT during the load.
+    """
+    pattern = helper.Pattern(1024 * 1024)
+    mix = httpbench.DEFAULT_MIX + (httpbench.Request("GET", "srv/test_load"),)
+
+    try:
+        shell.run_check(f"{pattern.command()} > /srv/www/test_load")
+
+        with helper.ThermalSampler(shell) as thermal:
+            busy_before, total_before = helper.cpu_times(shell)
+            result = httpbench.run_load(f"http://{strategy.network.address}", mix, clients=clients, duration=30)
+            busy_after, total_after = helper.cpu_times(shell)
+
+    finally:
+        shell.run("rm -f /srv/www/test_load")
+
+    summary = result.summary()
+    with open(artifact("summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    total = summary["total"]
+    benchmark.record("requests per second", total["rps"], "1/s")
+    for p in ("p50", "p95", "p99"):
+        benchmark.record(f"latency {p}", total[p] * 1000, "ms", higher_is_better=False)
+    benchmark.record("static download", summary["GET srv/test_load"]["MB/s"], "MB/s")
+    benchmark.record(
+        "cpu", (busy_after - busy_before) / (total_after - total_before) * 100, "%", higher_is_better=None
+    )
+    if thermal.temperatures:
+        benchmark.record("soc temperature max", max(thermal.temperatures), "°C", higher_is_better=None)
+        benchmark.record("soc temperature mean", statistics.mean(thermal.temperatures), "°C", higher_is_better=None)
+
+    assert total["errors"] == 0, "Requests failed:\n" + httpbench.format_summary(summary)
+    benchmark.check()
+
+
+@pytest.mark.parametrize(
+    "writes",
+    (False, pytest.param(True, marks=pytest.mark.lg_feature("eet"))),
+    ids=("read", "write"),
+)
+def test_tacd_http_latency_profile(strategy, shell, benchmark, artifact, record_property, writes):
+    """
+    Profile the latency of each tacd endpoint used in this file, see `httpbench.py --profile`.
+
+    Writing toggles e.g. the DUT power and the outputs, so it is only profiled on places with the test device
+    instead of a real DUT.
+    The latency percentiles of each endpoint are checked against previous runs on the same place.
+    """
+    result = httpbench.profile(f"http://{strategy.network.address}", writes=writes)
+    summary = result.summary()
+
+    with open(artifact("profile.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    record_property("latency histograms", httpbench.format_histograms(summary))
+
+    for name, entry in summary.items():
+        if name == "total":
+            continue
+        for p in ("p50", "p95", "p99"):
+            benchmark.record(f"{name} {p}", entry[p] * 1000, "ms", higher_is_better=False)
+
+    assert summary["total"]["errors"] == 0, "Requests failed:\n" + httpbench.format_summary(summary)
+    benchmark.check()
@@ -104,7 +104,7 @@ def test_system_running(shell):
 
 
 @pytest.fixture
-def clocktree(shell):
+def clocktree(strategy, shell):
     """
     Read the clock tree from the DUT and parse it into a data structure.
     """
@@ -120,7 +120,7 @@ def clocktree(shell):
 
     clks = {}
     clk = None
-    for line in shell.run_check("cat /sys/kernel/debug/clk/clk_summary"):
+    for line in strategy.fact("clk_summary"):
         if match := re_entry.match(line):
             if clk:
                 clks[clk.clk_name] = clk